@@ -11,17 +11,24 @@ warnings.filterwarnings("ignore")
 
 import json
 import os
+import sys
 import time
+import importlib.util
 from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
 
-# Try to import local whisper
-try:
-    import whisper
+# Shared helpers from the backend scripts (batch audio prefetch, model policy, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video-interview-platform" / "backend" / "scripts"))
+from model_policy import AUTO_MODEL, audio_seconds, choose_model_size, rtf_table, rtf_key
+from model_registry import model_registry, warm_sizes
+from transcribe_backends import device_from_env
+
+# Check for local whisper without importing it (torch loads with the first model)
+if importlib.util.find_spec("whisper") is not None:
     USE_LOCAL_WHISPER = True
     print("✅ Using local Whisper model")
-except ImportError:
+else:
     USE_LOCAL_WHISPER = False
     print("ℹ️ Local Whisper not found, will use OpenAI Whisper API")
 
@@ -39,6 +46,9 @@ load_dotenv(dotenv_path=r"D:\IS Project\video-interview-platform\backend\.env")
 UPLOADS_FOLDER = r"D:\IS Project\video-interview-platform\backend\uploads"
 OUTPUT_FOLDER = r"D:\IS Project\After_video\evaluations"
 QUESTIONS_FILE = r"D:\IS Project\After_video\current_questions.json"
+# Local Whisper model: tiny (default) ... large, or auto to pick per video from the
+# backlog and WHISPER_SLO_SEC using measured real-time factors (see model_policy.py)
+WHISPER_MODEL_SIZE = os.getenv("EVAL_WHISPER_MODEL_SIZE", "tiny")
 
 # Create output folder if not exists
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
@@ -49,18 +59,47 @@ client = OpenAI(
     api_key=os.getenv("OPENROUTER_API_KEY"),
 )
 
-def transcribe_video(video_path):
-    """Transcribe video using Whisper (local or API)"""
+
+def load_local_model(model_size):
+    """Local Whisper model from the shared registry, loaded once per process"""
+    announce = lambda: print(f"   Loading local Whisper model ({model_size})...")
+    return model_registry().get(model_size, device=device_from_env(), on_load=announce)
+
+
+def warm_local_models():
+    """Load WHISPER_WARM_MODELS up front instead of on the first video"""
+    if USE_LOCAL_WHISPER:
+        for model_size in warm_sizes():
+            load_local_model(model_size)
+
+
+def pick_model_size(video_path, queued_audio_sec=0.0):
+    """WHISPER_MODEL_SIZE, or with auto the size the model policy picks for this video"""
+    if WHISPER_MODEL_SIZE != AUTO_MODEL:
+        return WHISPER_MODEL_SIZE
+    model_size, decision = choose_model_size(audio_seconds(video_path), queued_audio_sec)
+    print(f"   Model policy: {model_size} (~{decision['estimated_sec']}s, SLO {decision['slo_sec']:.0f}s)")
+    return model_size
+
+
+def transcribe_video(video_path, model_size=None, audio=None):
+    """
+    Transcribe video using Whisper (local or API). model_size: local Whisper
+    model to use (default: pick_model_size); audio: already decoded audio of
+    the file, if any.
+    """
     print(f"\n📹 Processing video: {video_path}")
     
     try:
         if USE_LOCAL_WHISPER:
             # Use local whisper
-            print("   Loading local Whisper model (tiny)...")
-            model = whisper.load_model("tiny")
+            model_size = model_size or pick_model_size(video_path)
+            model = load_local_model(model_size)
             
             print("   Transcribing (this may take a while)...")
-            result = model.transcribe(video_path)
+            start_time = time.time()
+            result = model.transcribe(video_path if audio is None else audio)
+            rtf_table().record(rtf_key(model_size), audio_seconds(video_path), time.time() - start_time)
             
             full_text = result["text"].strip()
             segments = result.get("segments", [])
@@ -158,11 +197,11 @@ Only include red_flags if there are genuinely concerning indicators - an empty a
         return {"error": str(e)}
 
 
-def process_video_file(video_path, question_text="Tell me about yourself"):
+def process_video_file(video_path, question_text="Tell me about yourself", model_size=None, audio=None):
     """Complete pipeline: transcribe + evaluate"""
     
     # Step 1: Transcribe
-    transcript, segments = transcribe_video(video_path)
+    transcript, segments = transcribe_video(video_path, model_size, audio)
     
     if not transcript:
         return None
@@ -265,6 +304,7 @@ def process_all_videos_in_folder():
     
     print(f"   Found {len(all_videos)} video(s)")
     
+    pending = []
     for i, video_path in enumerate(all_videos):
         video_stem = Path(video_path).stem
         video_dir = Path(video_path).parent
@@ -284,13 +324,28 @@ def process_all_videos_in_folder():
                 pass
         
         question = sample_questions[question_num % len(sample_questions)]
-        
+        pending.append((i, video_path, question))
+    
+    if not pending:
+        return
+    
+    # Models are loaded once for the whole backlog; the next videos' audio is decoded
+    # in the background. With auto, the backlog ahead of each video counts as load.
+    decoded = [None] * len(pending)
+    if USE_LOCAL_WHISPER:
+        from batch_transcription import prefetch_audio
+        decoded = (audio for _, audio, _ in prefetch_audio(video_path for _, video_path, _ in pending))
+    
+    queued_audio_sec = 0.0
+    for (i, video_path, question), audio in zip(pending, decoded):
         print(f"\n{'='*60}")
         print(f"Processing video {i+1}/{len(all_videos)}: {Path(video_path).name}")
         print(f"Question: {question}")
         print('='*60)
         
-        process_video_file(video_path, question)
+        model_size = pick_model_size(video_path, queued_audio_sec) if USE_LOCAL_WHISPER else None
+        process_video_file(video_path, question, model_size, audio)
+        queued_audio_sec += audio_seconds(video_path) or 0.0
 
 
 class VideoHandler(FileSystemEventHandler if WATCHDOG_AVAILABLE else object):
@@ -320,6 +375,7 @@ def watch_folder():
     print(f"\n👁️ Watching folder: {UPLOADS_FOLDER} (including subfolders)")
     print("Press Ctrl+C to stop\n")
     
+    warm_local_models()
     event_handler = VideoHandler()
     observer = Observer()
     # Set recursive=True to watch candidate subfolders
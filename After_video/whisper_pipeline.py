@@ -12,20 +12,24 @@ warnings.filterwarnings("ignore")
 
 import json
 import os
+import sys
 import time
+import difflib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from openai import OpenAI
 from dotenv import load_dotenv
 
-# Load whisper
-try:
-    import whisper
-    WHISPER_MODEL = None  # Lazy load
-    print("✅ Whisper installed and ready")
-except ImportError:
-    print("❌ Whisper not installed. Run: pip install openai-whisper")
-    exit(1)
+# Shared helpers from the backend scripts (transcription backends, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "video-interview-platform" / "backend" / "scripts"))
+from transcribe_backends import import_backend, backend_from_env
+from model_registry import model_registry, warm_sizes
+from speech_activity import transcribe_speech
+from batch_transcription import prefetch_audio
+from streaming_transcription import follow_file
+from model_policy import AUTO_MODEL, audio_seconds, choose_model_size, rtf_table, rtf_key
 
 # Load watchdog
 try:
@@ -39,9 +43,33 @@ except ImportError:
 # Load environment
 load_dotenv(dotenv_path=r"D:\IS Project\video-interview-platform\backend\.env")
 
+# Load whisper backend: WHISPER_BACKEND=torch (openai-whisper) or ctranslate2
+# (faster-whisper int8), plus WHISPER_THREADS, WHISPER_BEAM_SIZE, WHISPER_COMPUTE_TYPE, WHISPER_DEVICE;
+# models are loaded lazily through the shared registry (WHISPER_MAX_MODELS, WHISPER_WARM_MODELS)
+WHISPER_BACKEND_OPTIONS = backend_from_env()
+try:
+    import_backend(WHISPER_BACKEND_OPTIONS["backend"])
+    print(f"✅ Whisper ({WHISPER_BACKEND_OPTIONS['backend']}) installed and ready")
+except ImportError as e:
+    print(f"❌ {e}")
+    exit(1)
+
 # Configuration
 UPLOADS_FOLDER = r"D:\IS Project\video-interview-platform\backend\uploads"
-WHISPER_MODEL_SIZE = "base"  # Options: tiny, base, small, medium, large
+# Options: tiny, base, small, medium, large, or auto: per video from load and
+# WHISPER_SLO_SEC using the real-time factors measured on this host (see model_policy.py)
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+WHISPER_VAD = os.getenv("WHISPER_VAD", "off").lower() in ("on", "1", "true")  # transcribe speech only
+WHISPER_CHUNK_SEC = float(os.getenv("WHISPER_CHUNK_SEC", "0"))  # >0: parallel chunks of about this length
+WHISPER_CHUNK_JOBS = int(os.getenv("WHISPER_CHUNK_JOBS", "0"))  # chunk processes (0 = CPU count)
+WHISPER_STREAMING = os.getenv("WHISPER_STREAMING", "off").lower() in ("on", "1", "true")  # transcribe during upload
+WHISPER_STREAM_IDLE_SEC = float(os.getenv("WHISPER_STREAM_IDLE_SEC", "3"))  # no growth this long = upload done
+# Two-tier mode: a provisional transcript + evaluation from the fast model right away,
+# then a background pass with WHISPER_MODEL_SIZE that re-evaluates only if the
+# transcript changed by more than WHISPER_TWO_TIER_MIN_CHANGE (share of words)
+WHISPER_TWO_TIER = os.getenv("WHISPER_TWO_TIER", "off").lower() in ("on", "1", "true")
+WHISPER_FAST_MODEL_SIZE = os.getenv("WHISPER_FAST_MODEL_SIZE", "tiny")
+WHISPER_TWO_TIER_MIN_CHANGE = float(os.getenv("WHISPER_TWO_TIER_MIN_CHANGE", "0.1"))
 
 # OpenRouter Client for LLM evaluation
 client = OpenAI(
@@ -52,42 +80,105 @@ client = OpenAI(
 # Store loaded questions per candidate
 candidate_questions = {}
 
+# Evaluation file updates happen on the watcher and final-pass threads
+evaluation_file_lock = threading.Lock()
+final_pass_executor = ThreadPoolExecutor(max_workers=1)  # two-tier final passes, one at a time
+
+
+def pipeline_rtf_key(model_size):
+    """Key of a model's measured real-time factor with the pipeline's settings"""
+    return rtf_key(model_size, WHISPER_BACKEND_OPTIONS["backend"], WHISPER_BACKEND_OPTIONS["compute_type"],
+                   WHISPER_BACKEND_OPTIONS["beam_size"], chunked=bool(WHISPER_CHUNK_SEC), vad=WHISPER_VAD)
+
+
+def pick_model_size(video_path=None, queued_audio_sec=0.0):
+    """WHISPER_MODEL_SIZE, or with auto the size the model policy picks for this video"""
+    if WHISPER_MODEL_SIZE != AUTO_MODEL:
+        return WHISPER_MODEL_SIZE
+    model_size, decision = choose_model_size(audio_seconds(video_path), queued_audio_sec, label=pipeline_rtf_key)
+    print(f"   ⚖️ Model policy: {model_size} (~{decision['estimated_sec']}s, SLO {decision['slo_sec']:.0f}s, "
+          f"{decision['queued_audio_sec']:.0f}s of audio queued)")
+    return model_size
+
 
-def load_whisper_model():
-    """Lazy load whisper model"""
-    global WHISPER_MODEL
-    if WHISPER_MODEL is None:
-        print(f"\n📥 Loading Whisper model ({WHISPER_MODEL_SIZE})... This may take a moment.")
-        WHISPER_MODEL = whisper.load_model(WHISPER_MODEL_SIZE)
-        print("✅ Whisper model loaded!")
-    return WHISPER_MODEL
+def load_whisper_model(model_size=None, slot=None):
+    """
+    Whisper model from the shared registry, loaded on first use (default:
+    WHISPER_MODEL_SIZE). slot: a separate instance for another thread (the
+    two-tier final pass) so one model never decodes two files at once
+    """
+    model_size = model_size or pick_model_size()
+    announce = lambda: print(f"\n📥 Loading Whisper model ({model_size}, {WHISPER_BACKEND_OPTIONS['backend']})... This may take a moment.")
+    return model_registry().get(model_size, chunk_sec=WHISPER_CHUNK_SEC, chunk_jobs=WHISPER_CHUNK_JOBS,
+                                slot=slot, on_load=announce, **WHISPER_BACKEND_OPTIONS)
 
 
-def transcribe_video(video_path):
-    """Transcribe video using Whisper"""
-    print(f"\n🎙️ Transcribing: {Path(video_path).name}")
+def transcribe_video(video_path, audio=None, model_size=None, slot=None):
+    """Transcribe video using Whisper (audio: already decoded audio of the file, if any)"""
+    model_size = model_size or pick_model_size(video_path)
+    print(f"\n🎙️ Transcribing: {Path(video_path).name} ({model_size})")
     
     try:
-        model = load_whisper_model()
+        model = load_whisper_model(model_size, slot)
         
         start_time = time.time()
-        result = model.transcribe(video_path)
+        if WHISPER_VAD:
+            result = transcribe_speech(model, video_path if audio is None else audio)
+            vad = result["vad"]
+            print(f"   🔇 Skipped {vad['skipped_sec']}s of silence ({vad['skipped_percent']}% of {vad['audio_sec']}s)")
+        else:
+            result = model.transcribe(video_path if audio is None else audio)
         elapsed = time.time() - start_time
+        rtf_table().record(pipeline_rtf_key(model_size), audio_seconds(video_path), elapsed)
         
-        transcript = result["text"].strip()
+        transcript = result["text"]
         print(f"   ✅ Transcription complete ({elapsed:.1f}s): {len(transcript)} characters")
         
         return {
             "text": transcript,
             "segments": result.get("segments", []),
             "language": result.get("language", "en"),
-            "duration": elapsed
+            "duration": elapsed,
+            "model": model_size,
+            "vad": result.get("vad")
         }
     except Exception as e:
         print(f"   ❌ Transcription error: {e}")
         return None
 
 
+def transcribe_growing_video(video_path):
+    """Transcribe a video window by window while it is still being uploaded"""
+    print(f"\n🎙️ Transcribing while uploading: {Path(video_path).name}")
+    
+    try:
+        model_size = pick_model_size()
+        model = load_whisper_model(model_size)
+        
+        start_time = time.time()
+        result = follow_file(video_path, model, idle_sec=WHISPER_STREAM_IDLE_SEC,
+                             on_commit=lambda segments: print(f"   📝 +{len(segments)} segment(s) up to {segments[-1]['end']:.0f}s"))
+        elapsed = time.time() - start_time
+        if result is None:
+            print("   ⚠️ File disappeared during upload")
+            return None
+        
+        transcript = result["text"]
+        print(f"   ✅ Transcription complete {result['streaming']['tail_sec']:.1f}s after upload ended: {len(transcript)} characters")
+        
+        return {
+            "text": transcript,
+            "segments": result["segments"],
+            "language": result["language"],
+            "duration": elapsed,
+            "model": model_size,
+            "streaming": result["streaming"]
+        }
+    except Exception as e:
+        print(f"   ❌ Streaming transcription error: {e}")
+        return None
+
+
 def evaluate_answer(question, answer_transcript):
     """Evaluate answer with LLM"""
     print("   🤖 Evaluating with AI...")
@@ -201,8 +292,19 @@ def get_question_for_video(video_path):
         return fallback[(question_num - 1) % len(fallback)]
 
 
-def update_evaluation_file(candidate_folder, candidate_name, question_num, question_text, transcript, evaluation):
-    """Update the cumulative evaluation file"""
+def update_evaluation_file(candidate_folder, candidate_name, question_num, question_text, transcript, evaluation,
+                           status="final", model_size=None):
+    """
+    Update the cumulative evaluation file. status: "provisional" (fast
+    two-tier pass, to be replaced) or "final"
+    """
+    with evaluation_file_lock:
+        return _update_evaluation_file(candidate_folder, candidate_name, question_num, question_text,
+                                       transcript, evaluation, status, model_size or WHISPER_MODEL_SIZE)
+
+
+def _update_evaluation_file(candidate_folder, candidate_name, question_num, question_text, transcript, evaluation,
+                            status, model_size):
     eval_file = candidate_folder / f"{candidate_name}_evaluation.json"
     
     # Load existing data or create new
@@ -228,6 +330,8 @@ def update_evaluation_file(candidate_folder, candidate_name, question_num, quest
         "question": question_text,
         "transcript": transcript,
         "evaluation": evaluation,
+        "status": status,
+        "whisper_model": model_size,
         "evaluated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     
@@ -263,12 +367,50 @@ def update_evaluation_file(candidate_folder, candidate_name, question_num, quest
     with open(eval_file, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
     
-    print(f"   📊 Updated: {eval_file.name}")
+    print(f"   📊 Updated: {eval_file.name} (Q{question_num} {status})")
     return eval_file
 
 
-def process_video(video_path):
-    """Complete pipeline: transcribe + evaluate + update files"""
+def transcript_change(old_text, new_text):
+    """Share of words that differ between two transcripts (0 = identical)"""
+    old_words, new_words = old_text.lower().split(), new_text.lower().split()
+    if not old_words and not new_words:
+        return 0.0
+    return 1 - difflib.SequenceMatcher(None, old_words, new_words).ratio()
+
+
+def final_pass(video_path, candidate_folder, candidate_name, question_num, question_text,
+               provisional_transcript, provisional_evaluation, model_size):
+    """Two-tier background pass: re-transcribe with the accurate model and finalize the evaluation"""
+    try:
+        transcript_data = transcribe_video(str(video_path), model_size=model_size, slot="final-pass")
+        if not transcript_data or not transcript_data["text"]:
+            print(f"   ⚠️ Final pass failed for {video_path.name}, keeping provisional result")
+            return
+        
+        transcript = transcript_data["text"]
+        change = transcript_change(provisional_transcript, transcript)
+        if change > WHISPER_TWO_TIER_MIN_CHANGE:
+            print(f"   🔁 {video_path.name}: transcript changed {change:.0%}, re-evaluating")
+            evaluation = evaluate_answer(question_text, transcript)
+        else:
+            print(f"   ✔️ {video_path.name}: transcript changed {change:.0%}, keeping evaluation")
+            evaluation = provisional_evaluation
+        
+        update_evaluation_file(candidate_folder, candidate_name, question_num, question_text,
+                               transcript, evaluation, status="final", model_size=model_size)
+        if evaluation is not provisional_evaluation:
+            print_evaluation_summary(evaluation, question_num)
+    except Exception as e:
+        print(f"   ❌ Final pass error for {video_path.name}: {e}")
+
+
+def process_video(video_path, audio=None, transcript_data=None, queued_audio_sec=0.0):
+    """
+    Complete pipeline: transcribe + evaluate + update files. transcript_data:
+    the transcription if already done (see transcribe_growing_video);
+    queued_audio_sec: audio waiting ahead of this video, for WHISPER_MODEL_SIZE=auto
+    """
     video_path = Path(video_path)
     video_name = video_path.stem  # e.g., "JohnDoe_Q1"
     candidate_folder = video_path.parent
@@ -295,8 +437,14 @@ def process_video(video_path):
     question_text = get_question_for_video(video_path)
     print(f"   Question: {question_text[:80]}...")
     
-    # Step 1: Transcribe with Whisper
-    transcript_data = transcribe_video(str(video_path))
+    # Step 1: Transcribe with Whisper (the fast model first in two-tier mode)
+    accurate_size = None
+    if not transcript_data:
+        accurate_size = pick_model_size(video_path, queued_audio_sec)
+    two_tier = WHISPER_TWO_TIER and accurate_size is not None and WHISPER_FAST_MODEL_SIZE != accurate_size
+    if not transcript_data:
+        transcript_data = transcribe_video(str(video_path), audio,
+                                           WHISPER_FAST_MODEL_SIZE if two_tier else accurate_size)
     
     if not transcript_data or not transcript_data["text"]:
         print("   ❌ Failed to transcribe video")
@@ -309,15 +457,24 @@ def process_video(video_path):
     evaluation = evaluate_answer(question_text, transcript)
     
     # Step 3: Update evaluation file (includes transcript)
-    update_evaluation_file(candidate_folder, candidate_name, question_num, question_text, transcript, evaluation)
+    status = "provisional" if two_tier else "final"
+    update_evaluation_file(candidate_folder, candidate_name, question_num, question_text, transcript, evaluation,
+                           status=status, model_size=transcript_data.get("model"))
     
     # Print summary
     print_evaluation_summary(evaluation, question_num)
     
+    # Step 4 (two-tier): accurate transcript in the background
+    if two_tier:
+        print(f"   ⏳ Provisional result saved, final pass with {accurate_size} queued")
+        final_pass_executor.submit(final_pass, video_path, candidate_folder, candidate_name, question_num,
+                                   question_text, transcript, evaluation, accurate_size)
+    
     return {
         "video": video_name,
         "transcript": transcript,
-        "evaluation": evaluation
+        "evaluation": evaluation,
+        "status": status
     }
 
 
@@ -374,6 +531,16 @@ class VideoHandler(FileSystemEventHandler):
         try:
             print(f"\n🆕 New video detected: {Path(file_path).name}")
             
+            if WHISPER_STREAMING:
+                # Transcribe while the upload is still being written; if that
+                # fails, process_video transcribes the finished file instead
+                transcript_data = transcribe_growing_video(file_path)
+                if not os.path.exists(file_path):
+                    print("   ⚠️ File no longer exists (was temporary)")
+                    return
+                process_video(file_path, transcript_data=transcript_data)
+                return
+            
             # Wait for file to be fully written
             print("   ⏳ Waiting for file to finish writing...")
             time.sleep(3)
@@ -416,6 +583,10 @@ def watch_and_process():
     print("   • {name}_evaluation.json - All evaluation results")
     print("\n⏳ Waiting for videos... (Press Ctrl+C to stop)\n")
     
+    # Load WHISPER_WARM_MODELS now rather than on the first video
+    for model_size in warm_sizes():
+        load_whisper_model(model_size)
+    
     # Process any existing unprocessed videos first
     process_existing_videos()
     
@@ -433,6 +604,9 @@ def watch_and_process():
         observer.stop()
     
     observer.join()
+    if WHISPER_TWO_TIER:
+        print("⏳ Finishing queued final passes...")
+    final_pass_executor.shutdown(wait=True)
     print("✅ Pipeline stopped.")
 
 
@@ -480,8 +654,13 @@ def process_existing_videos():
     
     if unprocessed:
         print(f"   Found {len(unprocessed)} unprocessed video(s)")
-        for video_path in sorted(unprocessed):
-            process_video(video_path)
+        # Models stay resident; the next videos' audio is decoded in the background
+        # (a failed decode is retried by Whisper itself, which reports the error).
+        # With WHISPER_MODEL_SIZE=auto, the backlog ahead of each video counts as load.
+        queued_audio_sec = 0.0
+        for video_path, audio, _ in prefetch_audio(sorted(unprocessed)):
+            process_video(video_path, audio, queued_audio_sec=queued_audio_sec)
+            queued_audio_sec += audio_seconds(video_path) or 0.0
     else:
         print("   No unprocessed videos found.")
 
@@ -31,7 +31,15 @@ module.exports = {
     openaiApiKey: process.env.OPENAI_API_KEY || null,
     whisperXScriptPath: process.env.WHISPERX_SCRIPT_PATH || path.resolve(__dirname, '..', 'scripts', 'whisper_transcribe.py'),
     useWhisperNode: process.env.USE_WHISPER_NODE === 'true',
+    // Extra CLI flags for whisper_transcribe.py, e.g. WHISPER_ARGS="--model small"
+    whisperArgs: (process.env.WHISPER_ARGS || '').split(/\s+/).filter(Boolean),
+    // Keep one whisper_transcribe.py --serve process alive instead of spawning per upload
+    whisperServer: process.env.WHISPER_SERVER === 'true',
     deepfaceScriptPath: process.env.DEEPFACE_SCRIPT_PATH || path.join(__dirname, '..', 'scripts', 'deepface_analyze.py'),
+    // Extra CLI flags for deepface_analyze.py, e.g. DEEPFACE_ARGS="--batch-size 8"
+    deepfaceArgs: (process.env.DEEPFACE_ARGS || '').split(/\s+/).filter(Boolean),
+    // Keep one deepface_analyze.py --serve process alive instead of spawning per video
+    deepfaceServer: process.env.DEEPFACE_SERVER === 'true',
     uploadsDir,
     evaluationsDir,
     uploadWatcherEnabled: process.env.UPLOAD_WATCHER !== 'false',
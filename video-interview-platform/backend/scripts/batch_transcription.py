@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Batch transcription with one resident model, used by whisper_transcribe.py
+(--batch / --manifest), After_video/whisper_pipeline.py
+(process_existing_videos) and After_video/evaluate_interview.py
+(process_all_videos_in_folder).
+
+While the model transcribes one file, the audio of the next ones is probed
+and decoded (ffmpeg, see speech_activity.load_audio) on background threads,
+so the model never waits for a decode. Results come back in input order as
+each file finishes.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from media_probe import probe_media
+from speech_activity import load_audio, transcribe_speech
+
+DEFAULT_PREFETCH = 2  # files decoded ahead of the one being transcribed
+DEFAULT_DECODE_WORKERS = 2
+
+
+def decode_file(path):
+    """16 kHz float32 audio of a file, or None if it has no audio stream"""
+    probe = probe_media(path)
+    if probe is not None and not probe["has_audio"]:
+        return None
+    return load_audio(path)
+
+
+def prefetch_audio(paths, depth=DEFAULT_PREFETCH, workers=DEFAULT_DECODE_WORKERS):
+    """
+    Yield (path, audio, error) in input order, decoding up to `depth` files
+    ahead on `workers` threads; audio is None for files without an audio
+    stream, error is the decode exception or None.
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {}
+        for i, path in enumerate(paths):
+            for j in range(i, min(len(paths), i + depth + 1)):
+                if j not in pending:
+                    pending[j] = pool.submit(decode_file, paths[j])
+            try:
+                yield path, pending.pop(i).result(), None
+            except Exception as e:
+                yield path, None, e
+
+
+def read_manifest(manifest_path):
+    """Paths from a manifest: a JSON list, or one path per line (# comments allowed)"""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return [str(p) for p in json.loads(content)]
+    return [line.strip() for line in content.splitlines()
+            if line.strip() and not line.strip().startswith("#")]
+
+
+def transcribe_batch(transcriber, paths, vad=False, depth=DEFAULT_PREFETCH):
+    """
+    Yield (path, result, error) for each file with a loaded transcriber (see
+    transcribe_backends.py); result is its {"text", "language", "segments"},
+    empty for files without audio, and None when error is set.
+    """
+    for path, audio, error in prefetch_audio(paths, depth):
+        if error is not None:
+            yield path, None, error
+            continue
+        if audio is None:
+            yield path, {"text": "", "language": "en", "segments": []}, None
+            continue
+        try:
+            result = transcribe_speech(transcriber, audio) if vad else transcriber.transcribe(audio)
+        except Exception as e:
+            yield path, None, e
+            continue
+        yield path, result, None
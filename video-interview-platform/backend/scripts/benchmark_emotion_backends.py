@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compare the DeepFace and ONNX Runtime emotion backends on the same frames.
+Usage: python benchmark_emotion_backends.py <video_path> [--frames 60] [--onnx-model path]
+Output: JSON to stdout with frames per second for each backend, dominant
+emotion agreement and the absolute drift of the emotion scores (0-100 scale)
+of the ONNX backend against DeepFace.
+"""
+
+import sys
+import json
+import time
+import argparse
+import warnings
+warnings.filterwarnings("ignore")
+
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+from deepface_analyze import EMOTION_KEYS, open_video, analyze_batch, warm_up
+
+
+def sample_frames(cv2, video_path, count):
+    """Up to count frames spread evenly over the video"""
+    cap, fps, total_frames, _ = open_video(cv2, video_path)
+    frames = []
+    try:
+        if total_frames > 0:
+            step = max(1, total_frames // count)
+            for idx in range(0, total_frames, step):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+                if len(frames) >= count:
+                    break
+        else:
+            while len(frames) < count:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+
+def time_backend(backend, frames, batch_size):
+    """(results, frames per second) for one backend over all frames"""
+    warm_up(backend)
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        results.extend(analyze_batch(backend, frames[i:i + batch_size], detector_backend="opencv"))
+    elapsed = time.perf_counter() - start
+    return results, (len(frames) / elapsed if elapsed > 0 else 0.0)
+
+
+def compare(reference, candidate):
+    """Dominant emotion agreement and score drift of candidate against reference"""
+    agree = 0
+    compared = 0
+    drifts = []
+    for ref, cand in zip(reference, candidate):
+        if not ref or not cand:
+            continue
+        compared += 1
+        agree += ref.get("dominant_emotion") == cand.get("dominant_emotion")
+        for key in EMOTION_KEYS:
+            drifts.append(abs(float(ref["emotion"].get(key, 0)) - float(cand["emotion"].get(key, 0))))
+    return {
+        "frames_compared": compared,
+        "dominant_agreement_percent": round(100 * agree / compared, 2) if compared else None,
+        "mean_abs_score_drift": round(sum(drifts) / len(drifts), 3) if drifts else None,
+        "max_abs_score_drift": round(max(drifts), 3) if drifts else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DeepFace vs ONNX emotion backends")
+    parser.add_argument("video_path")
+    parser.add_argument("--frames", type=int, default=60, help="Frames to sample from the video")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--onnx-model", help="ONNX model to benchmark (default: onnx_emotion default)")
+    parser.add_argument("--onnx-detector", help="YuNet ONNX face detector")
+    parser.add_argument("--onnx-threads", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        import cv2
+        from deepface import DeepFace
+        from onnx_emotion import OnnxEmotion
+    except ImportError as e:
+        print(json.dumps({"error": f"Missing dependency: {e}"}))
+        sys.exit(1)
+
+    try:
+        frames = sample_frames(cv2, args.video_path, args.frames)
+        if not frames:
+            raise ValueError(f"No frames decoded from {args.video_path}")
+
+        onnx = OnnxEmotion(model_path=args.onnx_model, detector_path=args.onnx_detector,
+                           threads=args.onnx_threads)
+        deepface_results, deepface_fps = time_backend(DeepFace, frames, args.batch_size)
+        onnx_results, onnx_fps = time_backend(onnx, frames, args.batch_size)
+
+        output = {
+            "video": args.video_path,
+            "frames": len(frames),
+            "onnx_model": onnx.model_path,
+            "fps": {"deepface": round(deepface_fps, 2), "onnx": round(onnx_fps, 2)},
+            "speedup": round(onnx_fps / deepface_fps, 2) if deepface_fps else None,
+            "drift": compare(deepface_results, onnx_results)
+        }
+        print(json.dumps(output, indent=2))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare transcription backends (see transcribe_backends.py) on the same files.
+Usage: python benchmark_transcribe_backends.py <file> [<file> ...] [--model base]
+                                               [--threads N] [--beam-size N]
+                                               [--compute-type int8]
+Output: JSON to stdout with, per backend, the model load time and the
+real-time factor (transcription time / audio duration; below 1 is faster
+than real time), and the word-level agreement of each backend's transcript
+with the torch (openai-whisper) one.
+"""
+
+import sys
+import json
+import time
+import argparse
+import difflib
+import warnings
+warnings.filterwarnings("ignore")
+
+from media_probe import probe_media
+from transcribe_backends import TRANSCRIBE_BACKENDS, DEFAULT_COMPUTE_TYPE, load_transcriber, model_label
+
+
+def audio_duration(path, result):
+    """Audio duration from the container, else from the last segment"""
+    probe = probe_media(path) or {}
+    duration = (probe.get("audio") or {}).get("duration_sec") or probe.get("duration_sec")
+    if not duration and result["segments"]:
+        duration = result["segments"][-1]["end"]
+    return duration or 0.0
+
+
+def word_agreement(reference, candidate):
+    """Share (0-100) of matching words between two transcripts"""
+    ref_words = reference.lower().split()
+    cand_words = candidate.lower().split()
+    if not ref_words and not cand_words:
+        return 100.0
+    return round(100 * difflib.SequenceMatcher(None, ref_words, cand_words).ratio(), 2)
+
+
+def run_backend(backend, files, args):
+    start = time.perf_counter()
+    transcriber = load_transcriber(backend, args.model, threads=args.threads,
+                                   beam_size=args.beam_size, compute_type=args.compute_type)
+    load_sec = time.perf_counter() - start
+
+    per_file = []
+    total_sec = 0.0
+    total_audio = 0.0
+    for path in files:
+        start = time.perf_counter()
+        result = transcriber.transcribe(path)
+        elapsed = time.perf_counter() - start
+        duration = audio_duration(path, result)
+        total_sec += elapsed
+        total_audio += duration
+        per_file.append({
+            "file": path,
+            "audio_sec": round(duration, 2),
+            "transcribe_sec": round(elapsed, 2),
+            "rtf": round(elapsed / duration, 3) if duration else None,
+            "text": result["text"]
+        })
+    return {
+        "model": model_label(backend, args.model, args.compute_type, args.beam_size),
+        "load_sec": round(load_sec, 2),
+        "rtf": round(total_sec / total_audio, 3) if total_audio else None,
+        "files": per_file
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transcription backends")
+    parser.add_argument("files", nargs="+", help="Audio/video files to transcribe")
+    parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--backends", default=",".join(TRANSCRIBE_BACKENDS),
+                        help="Comma-separated backends to compare (first is the reference)")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--beam-size", type=int, default=None)
+    parser.add_argument("--compute-type", default=DEFAULT_COMPUTE_TYPE)
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    output = {"backends": {}}
+    try:
+        for backend in backends:
+            output["backends"][backend] = run_backend(backend, args.files, args)
+    except Exception as e:
+        print(json.dumps({"error": str(e), **output}))
+        sys.exit(1)
+
+    reference = output["backends"][backends[0]]
+    for backend in backends[1:]:
+        report = output["backends"][backend]
+        for ref_file, file in zip(reference["files"], report["files"]):
+            file["word_agreement_percent"] = word_agreement(ref_file["text"], file["text"])
+        if reference["rtf"] and report["rtf"]:
+            report["speedup"] = round(reference["rtf"] / report["rtf"], 2)
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
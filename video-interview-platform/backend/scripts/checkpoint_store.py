@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for long-running analyses, so a killed or restarted run resumes
+where the previous attempt stopped instead of starting again from frame 0.
+
+A checkpoint is a pickled dict of the caller's partial state (for
+deepface_analyze.py: the accumulators, the next frame to sample and the
+tracker/scheduler state), stored under the same key as the result cache
+(file content hash + model + analysis parameters, see result_cache.py), so
+it is only ever resumed by an identical job. Writes are atomic (temp file +
+os.replace) and the checkpoint is deleted once the run completes.
+
+Environment:
+  ANALYSIS_CHECKPOINT_DIR           directory (default: backend/.cache/checkpoints)
+  ANALYSIS_CHECKPOINT_INTERVAL_SEC  seconds between checkpoints (default: 15)
+  ANALYSIS_CHECKPOINT=off           disable checkpoints
+"""
+
+import os
+import sys
+import time
+import pickle
+import tempfile
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "checkpoints")
+DEFAULT_INTERVAL_SEC = 15.0
+CHECKPOINT_VERSION = 1  # bump when the checkpointed state changes shape
+
+
+class Checkpointer:
+    """Loads, periodically saves and clears the checkpoint of one job"""
+
+    def __init__(self, path, interval_sec):
+        self.path = path
+        self.interval_sec = interval_sec
+        self.last_save = time.monotonic()
+        self.saves = 0
+
+    def load(self):
+        """Checkpointed state, or None if there is no usable checkpoint"""
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or from an incompatible version: start over
+            self.clear()
+            return None
+        if not isinstance(data, dict) or data.get("version") != CHECKPOINT_VERSION:
+            self.clear()
+            return None
+        return data["state"]
+
+    def due(self):
+        """True once interval_sec has passed since the last save"""
+        return time.monotonic() - self.last_save >= self.interval_sec
+
+    def save(self, state):
+        """Write state atomically; failures are logged and otherwise ignored"""
+        self.last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump({"version": CHECKPOINT_VERSION, "state": state}, f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                _remove(tmp_path)
+                raise
+            self.saves += 1
+        except OSError as e:
+            print(f"[checkpoint] save failed: {e}", file=sys.stderr)
+
+    def clear(self):
+        """Delete the checkpoint after a completed run"""
+        _remove(self.path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def open_checkpointer(key, enabled=True):
+    """Checkpointer for a job key unless disabled by the caller or ANALYSIS_CHECKPOINT=off"""
+    if not enabled or os.getenv("ANALYSIS_CHECKPOINT", "").lower() in ("off", "0", "false"):
+        return None
+    directory = os.path.abspath(os.getenv("ANALYSIS_CHECKPOINT_DIR") or DEFAULT_CHECKPOINT_DIR)
+    interval = float(os.getenv("ANALYSIS_CHECKPOINT_INTERVAL_SEC", DEFAULT_INTERVAL_SEC))
+    return Checkpointer(os.path.join(directory, key + ".ckpt"), interval)
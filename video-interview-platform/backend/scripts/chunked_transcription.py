@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Parallel chunked transcription of long answers, used by whisper_transcribe.py
+(--chunk-sec) and After_video/whisper_pipeline.py (WHISPER_CHUNK_SEC).
+
+Whisper decodes a file one 30s window after another in a single process. Here
+the audio is split near every chunk_sec at the quietest point within
+SPLIT_SEARCH_SEC of the target (see speech_activity.frame_levels), the chunks
+are transcribed across a process pool in which each worker loads the model
+once, and the segments are stitched back together: offsets are corrected,
+segments lying entirely in the overlap with the previous chunk are dropped,
+and words repeated across a boundary are removed once.
+
+Each chunk starts OVERLAP_SEC before its split point so a word cut at the
+split still reaches the model whole in one of the two chunks. Workers share
+the CPU: unless threads is given, each gets cpu_count // jobs threads.
+"""
+
+import os
+import re
+import atexit
+from functools import partial
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from speech_activity import SAMPLE_RATE, FRAME_SEC, frame_levels, load_audio
+from transcribe_backends import DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE, load_transcriber
+
+DEFAULT_CHUNK_SEC = 60.0
+SPLIT_SEARCH_SEC = 10.0  # how far from the target a split point may move
+SPLIT_WINDOW_SEC = 0.3  # levels are smoothed over this long when choosing the split
+OVERLAP_SEC = 1.0
+MAX_DEDUP_WORDS = 8  # longest repeated phrase removed at a boundary
+
+_worker_transcriber = None
+
+
+def _init_worker(load_options):
+    global _worker_transcriber
+    _worker_transcriber = load_transcriber(**load_options)
+
+
+def _transcribe_chunk(options, audio):
+    return _worker_transcriber.transcribe(audio, **options)
+
+
+def plan_chunks(audio, chunk_sec=DEFAULT_CHUNK_SEC, sample_rate=SAMPLE_RATE):
+    """Split points in samples, [0, ..., len(audio)], at quiet moments near every chunk_sec"""
+    total = len(audio)
+    if total <= chunk_sec * 1.5 * sample_rate:
+        return [0, total]
+    levels = frame_levels(audio, sample_rate)
+    window = max(1, int(SPLIT_WINDOW_SEC / FRAME_SEC))
+    smoothed = np.convolve(levels, np.ones(window), "same")
+    search = min(SPLIT_SEARCH_SEC, chunk_sec / 2)
+
+    points = [0]
+    while total - points[-1] > chunk_sec * 1.5 * sample_rate:
+        target = points[-1] / sample_rate + chunk_sec
+        lo = int((target - search) / FRAME_SEC)
+        hi = min(len(smoothed), int((target + search) / FRAME_SEC) + 1)
+        quietest = lo + int(np.argmin(smoothed[lo:hi]))
+        points.append(int(quietest * FRAME_SEC * sample_rate))
+    points.append(total)
+    return points
+
+
+def _words(text):
+    return [re.sub(r"[^\w']", "", w).lower() for w in text.split()]
+
+
+def _drop_repeated_words(previous_text, text):
+    """text without its leading words that repeat the end of previous_text"""
+    tail = _words(previous_text)[-MAX_DEDUP_WORDS:]
+    words = text.split()
+    head = _words(text)[:MAX_DEDUP_WORDS]
+    for n in range(min(len(tail), len(head)), 0, -1):
+        if tail[-n:] == head[:n] and any(head[:n]):
+            return " " + " ".join(words[n:]) if len(words) > n else ""
+    return text
+
+
+def stitch(results, points, sample_rate=SAMPLE_RATE):
+    """
+    Merge per-chunk results (each on its chunk's own timeline, chunk i
+    starting at max(0, points[i] - OVERLAP_SEC)) into one result on the
+    audio's timeline.
+    """
+    segments = []
+    for i, result in enumerate(results):
+        boundary = points[i] / sample_rate
+        offset = max(0.0, boundary - OVERLAP_SEC)
+        first = True
+        for segment in result.get("segments", []):
+            segment = dict(segment)
+            segment["start"] = round(segment["start"] + offset, 3)
+            segment["end"] = round(segment["end"] + offset, 3)
+            if i and segment["end"] <= boundary:
+                continue  # already transcribed by the previous chunk
+            if i and first and segments:
+                segment["text"] = _drop_repeated_words(segments[-1]["text"], segment["text"])
+            first = False
+            if segment["text"].strip():
+                segment["id"] = len(segments)
+                segments.append(segment)
+
+    languages = Counter(r.get("language") for r in results if r.get("language"))
+    return {
+        "text": "".join(s["text"] for s in segments).strip(),
+        "language": languages.most_common(1)[0][0] if languages else "en",
+        "segments": segments
+    }
+
+
+class ChunkedTranscriber:
+    """
+    Drop-in for the transcribers of transcribe_backends.py: transcribe(audio)
+    with a path or 16 kHz float32 array gives {"text", "language", "segments"}
+    (plus "chunks", the number transcribed), computed by a pool of `jobs`
+    processes that is started on first use and kept for later calls.
+    """
+
+    def __init__(self, backend=DEFAULT_BACKEND, model_size="base", threads=0, beam_size=None,
+                 compute_type=DEFAULT_COMPUTE_TYPE, jobs=0, chunk_sec=DEFAULT_CHUNK_SEC, device=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.chunk_sec = chunk_sec
+        self.load_options = {
+            "backend": backend, "model_size": model_size, "beam_size": beam_size,
+            "compute_type": compute_type, "device": device,
+            "threads": threads or max(1, (os.cpu_count() or 1) // self.jobs)
+        }
+        self.pool = None
+
+    def transcribe(self, audio, **options):
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+        points = plan_chunks(audio, self.chunk_sec)
+        starts = [max(0, p - int(OVERLAP_SEC * SAMPLE_RATE)) for p in points[:-1]]
+        chunks = [audio[start:end] for start, end in zip(starts, points[1:])]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                            initargs=(self.load_options,))
+            atexit.register(self.close)
+        results = list(self.pool.map(partial(_transcribe_chunk, options), chunks))
+        output = stitch(results, points)
+        output["chunks"] = len(chunks)
+        return output
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
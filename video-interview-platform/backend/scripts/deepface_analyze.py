@@ -1,163 +1,777 @@
 #!/usr/bin/env python3
 """
 DeepFace emotion analysis script for Node.js backend.
-Usage: python deepface_analyze.py <video_path>
-Output: JSON to stdout with per-frame emotions, timestamps, and summary.
-Samples 1 in every 5 frames.
+Usage: python deepface_analyze.py <video_path> [options]
+       python deepface_analyze.py <video_path> --stream [options]
+       python deepface_analyze.py --serve [--server-jobs N] [default options]
+Output: JSON to stdout with per-frame emotions, timestamps, and summary
+(NDJSON with --stream, JSON lines per job with --serve; see --help).
+Samples one frame every --sample-interval seconds (default ~0.17s, i.e.
+1 in every 5 frames at 30 fps), so results do not depend on the fps the
+browser recorded at. Results are cached by video content (result_cache.py)
+and long runs resume from checkpoints (checkpoint_store.py).
 """
 
 import sys
 import json
+import math
+import time
+import queue
+import signal
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import warnings
 warnings.filterwarnings("ignore")
 
 import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
+PROCESS_STARTED = time.time()  # --budget-seconds counts from here, model loading included
 
+from result_cache import open_cache, cache_key, content_hash, package_version
+from media_probe import probe_media, video_frame_estimate
+from checkpoint_store import open_checkpointer
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No video path provided"}))
-        sys.exit(1)
+EMOTION_KEYS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+SAMPLE_EVERY = 5  # analyze 1 in every 5 frames at the reference fps
+REFERENCE_FPS = 30.0
+DEFAULT_SAMPLE_INTERVAL_SEC = SAMPLE_EVERY / REFERENCE_FPS
+SAMPLER_STRATEGIES = ("grab", "seek", "read")
+TRACK_MIN_CONFIDENCE = 0.6  # normalized cross-correlation score
+TRACK_SEARCH_MARGIN = 0.5  # search window padding, as a fraction of the box size
+ADAPTIVE_MAX_INTERVAL_SEC = 1.0
+ADAPTIVE_THRESHOLD = 15.0  # emotion score points (scores are 0-100)
+WORKER_TYPES = ("thread", "process")
+DEFAULT_QUEUE_SIZE = 8  # decoded batches waiting for a worker
+DEFAULT_SERVER_JOBS = 2
+REUSE_HASH_SIZE = 16  # difference hash of 16x16 bits per sampled image
+BUDGET_RESERVE_SEC = 5.0  # kept free at the end of a budget for building and writing the output
+BUDGET_RESERVE_FRACTION = 0.25  # ...but never more than this share of the time left at the start
+BUDGET_SMOOTHING = 0.3  # weight of the newest batch in the per-sample cost average
+BUDGET_PLAN_FRACTION = 0.9  # plan the remaining samples into this share of the time left
+TIMELINE_FORMATS = ("dict", "columnar", "segments")
+# Codes used by the columnar timeline: EMOTION_KEYS indices, then these two
+TIMELINE_LABELS = EMOTION_KEYS + ["no_face", "unknown"]
+NO_FACE_CODE = len(EMOTION_KEYS)
+UNKNOWN_CODE = len(EMOTION_KEYS) + 1
+# analyze_video options that change speed but not the result (left out of cache keys)
+EXECUTION_OPTIONS = ("shards", "workers", "worker_type", "queue_size", "batch_size", "npz_path")
+EMOTION_BACKENDS = ("deepface", "onnx")
 
-    video_path = sys.argv[1]
 
-    try:
-        import cv2
-    except ImportError:
-        print(json.dumps({"error": "opencv-python not installed. Run: pip install opencv-python"}))
-        sys.exit(1)
+def parse_args(argv, defaults=None):
+    """Parse command line options; `defaults` (a namespace) overrides the built-in defaults"""
+    parser = argparse.ArgumentParser(description="DeepFace emotion analysis")
+    parser.add_argument("video_path", nargs="?", help="Path to the video file")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Sampled frames per DeepFace call (1 = one call per frame); "
+                             "the output is the same either way")
+    parser.add_argument("--sample-interval", type=float, default=DEFAULT_SAMPLE_INTERVAL_SEC,
+                        help="Seconds between analyzed frames")
+    parser.add_argument("--sampler", choices=SAMPLER_STRATEGIES, default="grab",
+                        help="How skipped frames are stepped over: grab (no decode), seek to each "
+                             "sample (sparse sampling of keyframe-heavy WebM) or read (legacy)")
+    parser.add_argument("--track", action="store_true",
+                        help="Detect the face once and track it instead of detecting on every frame")
+    parser.add_argument("--track-min-confidence", type=float, default=TRACK_MIN_CONFIDENCE,
+                        help="Tracking score below which the face is re-detected")
+    parser.add_argument("--detector-backend", default="opencv",
+                        help="DeepFace detector used for (re-)detection in tracking mode")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Sample sparsely while emotions are stable and densely around changes")
+    parser.add_argument("--adaptive-max-interval", type=float, default=ADAPTIVE_MAX_INTERVAL_SEC,
+                        help="Sparsest gap in seconds between analyzed frames in adaptive mode")
+    parser.add_argument("--adaptive-threshold", type=float, default=ADAPTIVE_THRESHOLD,
+                        help="Score change (0-100) that counts as an emotion change")
+    parser.add_argument("--reuse-threshold", type=int, default=None,
+                        help="Reuse the last result for frames whose 256-bit difference hash "
+                             "differs by at most this many bits (off by default; try 8)")
+    parser.add_argument("--budget-seconds", type=float, default=None,
+                        help="Wall-clock budget; sampling thins out (or stops) to finish in time")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Inference workers; > 1 decodes on a separate thread "
+                             "(not combinable with --adaptive)")
+    parser.add_argument("--worker-type", choices=WORKER_TYPES, default="thread",
+                        help="Run inference workers as threads or processes")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Max decoded batches waiting for a worker")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the video into N time ranges analyzed in parallel processes")
+    parser.add_argument("--timeline-format", choices=TIMELINE_FORMATS, default="dict",
+                        help="Per-frame dicts (default), compact NumPy-backed columns, "
+                             "or run-length emotion segments")
+    parser.add_argument("--npz", dest="npz_path",
+                        help="With --timeline-format columnar, write the timeline to this .npz file")
+    parser.add_argument("--stream", action="store_true",
+                        help="Emit NDJSON frame records as they are ready, then a summary record")
+    parser.add_argument("--backend", choices=EMOTION_BACKENDS, default="deepface",
+                        help="Emotion model runtime: DeepFace/TensorFlow or ONNX Runtime on CPU "
+                             "(model from onnx_emotion.py, OpenCV face detection)")
+    parser.add_argument("--onnx-model",
+                        help="Exported (optionally int8) emotion model for --backend onnx")
+    parser.add_argument("--onnx-detector",
+                        help="YuNet ONNX face detector for --backend onnx (default: Haar cascade)")
+    parser.add_argument("--onnx-threads", type=int, default=0,
+                        help="ONNX Runtime intra-op threads (0 = runtime default)")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="Do not resume from or write checkpoints (saved every "
+                             "ANALYSIS_CHECKPOINT_INTERVAL_SEC, default 15s; never with "
+                             "--shards or --stream)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the shared result cache (see result_cache.py); "
+                             "--stream, --npz and budget-reduced runs are never cached")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived worker reading JSON-line jobs from stdin (see "
+                             "serve()); options given with it are every job's defaults")
+    parser.add_argument("--server-jobs", type=int, default=DEFAULT_SERVER_JOBS,
+                        help="Videos analyzed concurrently in --serve mode")
+    args = parser.parse_args(argv, namespace=argparse.Namespace(**vars(defaults)) if defaults else None)
+    args.batch_size = max(1, args.batch_size)
+    if args.sample_interval <= 0:
+        parser.error("--sample-interval must be positive")
+    if args.reuse_threshold is not None and args.reuse_threshold < 0:
+        parser.error("--reuse-threshold must be >= 0")
+    if args.budget_seconds is not None and args.budget_seconds <= 0:
+        parser.error("--budget-seconds must be positive")
+    if args.adaptive and args.adaptive_max_interval < args.sample_interval:
+        parser.error("--adaptive-max-interval must be at least --sample-interval")
+    args.workers = max(1, args.workers)
+    args.queue_size = max(1, args.queue_size)
+    if args.adaptive and args.workers > 1:
+        parser.error("--adaptive cannot be combined with --workers > 1")
+    args.shards = max(1, args.shards)
+    if args.adaptive and args.shards > 1:
+        parser.error("--adaptive cannot be combined with --shards > 1")
+    return args
 
-    try:
-        from deepface import DeepFace
-    except ImportError:
-        print(json.dumps({"error": "deepface not installed. Run: pip install deepface"}))
-        sys.exit(1)
 
-    try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            print(json.dumps({"error": f"Cannot open video: {video_path}"}))
-            sys.exit(1)
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # WebM files often report fps=0 or absurdly high values
-        if not fps or fps <= 0 or fps > 240:
-            # Estimate fps by counting frames and duration
-            # For WebM, try to get duration from total_frames and msec position
-            if total_frames > 0 and total_frames < 2**60:
-                cap.set(cv2.CAP_PROP_POS_AVI_RATIO, 1)  # seek to end
-                duration_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
-                cap.set(cv2.CAP_PROP_POS_AVI_RATIO, 0)  # seek back to start
-                if duration_ms > 0:
-                    fps = total_frames / (duration_ms / 1000.0)
-                else:
-                    fps = 30.0
-            else:
-                fps = 30.0
-        
-        # Sanitize total_frames (WebM can report negative/huge values)
-        if total_frames <= 0 or total_frames > 2**60:
-            total_frames = 0  # will be updated after reading
-            count_frames = True
-        else:
-            count_frames = False
+def open_video(cv2, video_path):
+    """Open a video and return (cap, fps, total_frames, count_frames)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
 
-        sample_every = 5  # analyze 1 in every 5 frames
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-        emotions_timeline = []
-        frame_idx = 0
-        analyzed_count = 0
-        faces_detected = 0
+    # WebM files often report fps=0 or absurdly high values
+    if not fps or fps <= 0 or fps > 240:
+        # Take fps from the container metadata instead of seeking to the end
+        probe = probe_media(video_path) or {}
+        duration = probe.get("duration_sec")
+        fps = ((probe.get("video") or {}).get("fps")
+               or (total_frames / duration if duration and 0 < total_frames < 2**60 else 0))
+        if (not fps or fps > 240) and 0 < total_frames < 2**60:
+            # No usable probe (e.g. ffprobe missing): estimate from OpenCV's duration
+            cap.set(cv2.CAP_PROP_POS_AVI_RATIO, 1)  # seek to end
+            duration_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            cap.set(cv2.CAP_PROP_POS_AVI_RATIO, 0)  # seek back to start
+            fps = total_frames / (duration_ms / 1000.0) if duration_ms > 0 else 0
+            print(f"[deepface_analyze] no container fps from media_probe, estimated {fps:.2f} "
+                  "from OpenCV's duration", file=sys.stderr)
+        if not fps or fps > 240:
+            print("[deepface_analyze] fps unknown, assuming 30", file=sys.stderr)
+            fps = 30.0
 
-        # Accumulators for average scores
-        emotion_keys = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
-        score_sums = {e: 0.0 for e in emotion_keys}
-        dominant_counts = {e: 0 for e in emotion_keys}
-        # Track durations: consecutive frames with same dominant emotion
-        duration_tracker = {e: 0.0 for e in emotion_keys}
+    # Sanitize total_frames (WebM can report negative/huge values)
+    if total_frames <= 0 or total_frames > 2**60:
+        total_frames = 0  # will be updated after reading
+        count_frames = True
+    else:
+        count_frames = False
 
-        while True:
-            ret, frame = cap.read()
+    return cap, fps, total_frames, count_frames
+
+
+class FrameSampler:
+    """
+    Iterates (frame_idx, frame) over sampled frames only.
+    `step` (frames between samples) is read on every iteration, so callers may
+    change it while iterating. `frames_seen` is the number of frames walked past,
+    which replaces the frame count for containers that do not report one.
+    `start`/`end` restrict sampling to a frame range (used by --shards).
+    The "seek" strategy jumps to each sample and cannot count frames, so the
+    frame count is estimated from the last sample.
+    """
+
+    def __init__(self, cv2, cap, fps, step, strategy="grab", total_frames=0, start=0, end=0):
+        if strategy not in SAMPLER_STRATEGIES:
+            raise ValueError(f"Unknown sampler: {strategy}")
+        self.cv2 = cv2
+        self.cap = cap
+        self.fps = fps
+        self.step = max(1, int(step))
+        self.strategy = strategy
+        self.total_frames = total_frames
+        self.start = start
+        self.end = end  # exclusive; 0 = until the video ends
+        self.frames_seen = 0
+
+    def __iter__(self):
+        if self.strategy == "seek":
+            return self._iter_seek()
+        return self._iter_sequential()
+
+    def _iter_sequential(self):
+        frame_idx = self.start
+        next_sample = self.start
+        if self.start:
+            self.cap.set(self.cv2.CAP_PROP_POS_FRAMES, self.start)
+        while not self.end or frame_idx < self.end:
+            if frame_idx == next_sample or self.strategy == "read":
+                ret, frame = self.cap.read()
+            else:
+                # grab() demuxes/decodes but skips retrieve's conversion and copy
+                ret, frame = self.cap.grab(), None
             if not ret:
                 break
+            self.frames_seen = frame_idx + 1
 
-            if frame_idx % sample_every == 0:
-                analyzed_count += 1
-                timestamp_sec = round(frame_idx / fps, 2)
-
-                try:
-                    results = DeepFace.analyze(
-                        frame,
-                        actions=["emotion"],
-                        enforce_detection=False,
-                        silent=True
-                    )
-                    # DeepFace returns a list; take first face
-                    face_result = results[0] if isinstance(results, list) else results
-                    emotion_scores = face_result.get("emotion", {})
-                    dominant = face_result.get("dominant_emotion", "unknown")
-
-                    # Round scores to 2 decimals
-                    rounded_scores = {k: round(v, 2) for k, v in emotion_scores.items()}
-
-                    emotions_timeline.append({
-                        "frame": frame_idx,
-                        "timestamp_sec": timestamp_sec,
-                        "dominant_emotion": dominant,
-                        "scores": rounded_scores
-                    })
-
-                    faces_detected += 1
-
-                    # Accumulate for summary
-                    for e in emotion_keys:
-                        score_sums[e] += emotion_scores.get(e, 0.0)
-                    if dominant in dominant_counts:
-                        dominant_counts[dominant] += 1
-
-                    # Duration tracking: each sampled frame represents (sample_every / fps) seconds
-                    interval_sec = sample_every / fps
-                    if dominant in duration_tracker:
-                        duration_tracker[dominant] += interval_sec
-
-                except Exception:
-                    # No face detected or analysis failed - skip frame
-                    emotions_timeline.append({
-                        "frame": frame_idx,
-                        "timestamp_sec": timestamp_sec,
-                        "dominant_emotion": "no_face",
-                        "scores": {}
-                    })
-
+            if frame_idx == next_sample:
+                yield frame_idx, frame
+                next_sample = frame_idx + self.step
             frame_idx += 1
 
-        cap.release()
+    def _iter_seek(self):
+        frame_idx = self.start
+        last_pos_ms = -1.0
+        limit = min(f for f in (self.total_frames, self.end) if f) if (self.total_frames or self.end) else 0
+        while not limit or frame_idx < limit:
+            self.cap.set(self.cv2.CAP_PROP_POS_MSEC, frame_idx / self.fps * 1000.0)
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            # Some backends clamp seeks past the end to the last frame
+            pos_ms = self.cap.get(self.cv2.CAP_PROP_POS_MSEC)
+            if frame_idx > self.start and pos_ms <= last_pos_ms:
+                break
+            last_pos_ms = pos_ms
+            self.frames_seen = frame_idx + 1
 
-        # Update total_frames if we were counting
-        if count_frames:
-            total_frames = frame_idx
+            yield frame_idx, frame
+            frame_idx += self.step
+
+
+class FaceTracker:
+    """
+    Follows a single face across sampled frames.
+    The face is located with DeepFace.extract_faces on the first frame, then
+    matched against its previous crop (grayscale template) within a window
+    around the last box. Detection re-runs only when the match score falls
+    below min_confidence. Frames where no face is found report "no_face".
+    """
+
+    def __init__(self, cv2, DeepFace, detector_backend="opencv",
+                 min_confidence=TRACK_MIN_CONFIDENCE, search_margin=TRACK_SEARCH_MARGIN):
+        self.cv2 = cv2
+        self.DeepFace = DeepFace
+        self.detector_backend = detector_backend
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.box = None  # (x, y, w, h)
+        self.template = None
+        self.detections = 0
+        self.tracked = 0
+
+    def crop(self, frame):
+        """Return the face crop for this frame, or None if no face was found"""
+        gray = self.cv2.cvtColor(frame, self.cv2.COLOR_BGR2GRAY)
+
+        if self.box is not None:
+            box, score = self._match(gray)
+            if box is not None and score >= self.min_confidence:
+                self.tracked += 1
+                self._set_box(gray, box)
+                return self._cut(frame)
+
+        box = self._detect(frame)
+        if box is None:
+            self.box = None
+            self.template = None
+            return None
+        self._set_box(gray, box)
+        return self._cut(frame)
+
+    def _detect(self, frame):
+        self.detections += 1
+        try:
+            faces = self.DeepFace.extract_faces(
+                frame,
+                detector_backend=self.detector_backend,
+                enforce_detection=False
+            )
+        except Exception:
+            return None
+        # With enforce_detection=False a miss comes back as the whole frame with confidence 0
+        faces = [f for f in faces if f.get("confidence", 0) > 0]
+        if not faces:
+            return None
+        area = max(faces, key=lambda f: f.get("confidence", 0))["facial_area"]
+        box = (int(area["x"]), int(area["y"]), int(area["w"]), int(area["h"]))
+        return box if box[2] > 0 and box[3] > 0 else None
+
+    def _match(self, gray):
+        x, y, w, h = self.box
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(gray.shape[1], x + w + mx), min(gray.shape[0], y + h + my)
+        window = gray[y0:y1, x0:x1]
+        th, tw = self.template.shape[:2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None, 0.0
+        result = self.cv2.matchTemplate(window, self.template, self.cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = self.cv2.minMaxLoc(result)
+        return (x0 + loc[0], y0 + loc[1], w, h), score
+
+    def _set_box(self, gray, box):
+        x, y, w, h = box
+        x, y = max(0, x), max(0, y)
+        w, h = min(w, gray.shape[1] - x), min(h, gray.shape[0] - y)
+        self.box = (x, y, w, h)
+        self.template = gray[y:y + h, x:x + w].copy()
+
+    def _cut(self, frame):
+        x, y, w, h = self.box
+        return frame[y:y + h, x:x + w]
+
+    def state(self):
+        """Picklable snapshot for checkpoints"""
+        return {"box": self.box, "template": self.template,
+                "detections": self.detections, "tracked": self.tracked}
+
+    def restore(self, state):
+        self.box = state["box"]
+        self.template = state["template"]
+        self.detections = state["detections"]
+        self.tracked = state["tracked"]
+
+
+class AdaptiveScheduler:
+    """
+    Picks the frame step to the next sample from the latest result.
+    Any change of dominant emotion (including face <-> no face) or a score
+    moving by more than `threshold` resets the step to `min_step`; each
+    stable sample doubles it, up to `max_step`. Starts at `max_step`.
+    Each sample is credited with the time up to the next one, so durations
+    stay accurate with uneven spacing; the output's "sampling" key compares
+    the frames analyzed with a fixed-rate run.
+    """
+
+    def __init__(self, min_step, max_step, threshold=ADAPTIVE_THRESHOLD):
+        self.min_step = max(1, int(min_step))
+        self.max_step = max(self.min_step, int(max_step))
+        self.threshold = threshold
+        self.step = self.max_step
+        self._last = None
+        self._has_last = False
+
+    def observe(self, face_result):
+        """Record a result and return the step to the next sample"""
+        if self._has_last and self._changed(self._last, face_result):
+            self.step = self.min_step
+        elif self._has_last:
+            self.step = min(self.max_step, self.step * 2)
+        self._last = face_result
+        self._has_last = True
+        return self.step
+
+    def state(self):
+        """Picklable snapshot for checkpoints"""
+        return {"step": self.step, "last": self._last, "has_last": self._has_last}
+
+    def restore(self, state):
+        self.step = state["step"]
+        self._last = state["last"]
+        self._has_last = state["has_last"]
+
+    def _changed(self, prev, curr):
+        if prev is None or curr is None:
+            return (prev is None) != (curr is None)
+        if prev.get("dominant_emotion") != curr.get("dominant_emotion"):
+            return True
+        prev_scores = prev.get("emotion", {})
+        curr_scores = curr.get("emotion", {})
+        return any(
+            abs(curr_scores.get(e, 0.0) - prev_scores.get(e, 0.0)) > self.threshold
+            for e in EMOTION_KEYS
+        )
+
+
+class JobCancelled(Exception):
+    """A --serve job was cancelled by its client (see analyze_range's cancel)"""
+
+
+class ReusedResult:
+    """Stands in for the image and result of a frame that reuses the last analyzed frame's result"""
+    __slots__ = ()
+
+
+REUSED = ReusedResult()
+
+
+class FrameDeduplicator:
+    """
+    Flags sampled images that are near-duplicates of the last analyzed one.
+    Each image is reduced to a difference hash (dHash): grayscale, shrunk to
+    (hash_size + 1) x hash_size pixels, one bit per pair of horizontally
+    adjacent pixels (brighter or not). An image whose hash differs from the
+    reference in at most `threshold` bits is a duplicate; any other image
+    becomes the new reference. With --track the hash covers only the face crop,
+    so expression changes are not drowned out by a static background.
+    Reused frames still get a timeline entry; the output's "reuse" key counts
+    reused_frames and inferred_frames. Every shard starts without a reference.
+    """
+
+    def __init__(self, cv2, threshold, hash_size=REUSE_HASH_SIZE):
+        self.cv2 = cv2
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.reference = None
+
+    def hash(self, image):
+        gray = self.cv2.cvtColor(image, self.cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        small = self.cv2.resize(gray, (self.hash_size + 1, self.hash_size),
+                                interpolation=self.cv2.INTER_AREA)
+        return small[:, 1:] > small[:, :-1]
+
+    def is_duplicate(self, image):
+        bits = self.hash(image)
+        if self.reference is not None and int((bits != self.reference).sum()) <= self.threshold:
+            return True
+        self.reference = bits
+        return False
+
+    def reset(self):
+        """Forget the reference (e.g. after a frame without a face)"""
+        self.reference = None
+
+
+class BudgetController:
+    """
+    Keeps a run inside a wall-clock deadline (--budget-seconds).
+    The cost of one sample (decode + inference, i.e. the time between completed
+    batches divided by their size) is measured from the first batch on and
+    smoothed. After each batch the frame step is set so that the samples left
+    before end_frame fit in the time left, never denser than base_step, and
+    should_stop() turns true once not even one more batch fits. Whatever was
+    analyzed by then is still returned as a normal result. The reserve is at
+    most a BUDGET_RESERVE_FRACTION of the time left when analysis starts, so
+    short budgets still get time to sample. max_step is the widest spacing
+    actually taken between samples (set by the caller). The output's "budget"
+    key reports coverage, mean and widest intervals and whether sampling was
+    reduced or stopped early; such results are not cached.
+    """
+
+    def __init__(self, deadline, base_step, end_frame=0, reserve_sec=BUDGET_RESERVE_SEC):
+        self.deadline = deadline
+        self.base_step = base_step
+        self.end_frame = end_frame  # 0 = unknown: no step planning, only the stop check
+        self.reserve_sec = max(0.0, min(reserve_sec, BUDGET_RESERVE_FRACTION * (deadline - time.time())))
+        self.sample_cost = None
+        self.max_step = base_step
+        self.stopped_early = False
+        self._last = time.time()
+
+    def _time_left(self, now):
+        return self.deadline - self.reserve_sec - now
+
+    def observe(self, samples, next_frame):
+        """Record a completed batch and return the step for the following samples"""
+        now = time.time()
+        cost = (now - self._last) / max(1, samples)
+        self._last = now
+        self.sample_cost = cost if self.sample_cost is None else (
+            BUDGET_SMOOTHING * cost + (1 - BUDGET_SMOOTHING) * self.sample_cost)
+
+        step = self.base_step
+        if self.end_frame:
+            affordable = max(1.0, BUDGET_PLAN_FRACTION * self._time_left(now) / self.sample_cost)
+            remaining = max(0, self.end_frame - next_frame)
+            step = max(self.base_step, math.ceil(remaining / affordable))
+        return step
+
+    def should_stop(self, batch_size, next_frame):
+        """True when the next batch would run past the deadline"""
+        if self.sample_cost is None or (self.end_frame and next_frame >= self.end_frame):
+            return False
+        self.stopped_early = self._time_left(time.time()) < self.sample_cost * batch_size
+        return self.stopped_early
+
+    def state(self):
+        """Picklable snapshot for checkpoints"""
+        return {"max_step": self.max_step}
+
+    def restore(self, state):
+        self.max_step = max(self.max_step, state["max_step"])
+
+
+def _first_face(result):
+    """DeepFace returns a list of faces (a list of lists for batches); take the first face"""
+    while isinstance(result, list):
+        if not result:
+            return None
+        result = result[0]
+    return result
+
+
+def analyze_frame(DeepFace, frame, **analyze_kwargs):
+    """Run emotion analysis on one frame. Returns the face result or None."""
+    try:
+        results = DeepFace.analyze(
+            frame,
+            actions=["emotion"],
+            enforce_detection=False,
+            silent=True,
+            **analyze_kwargs
+        )
+        return _first_face(results)
+    except Exception:
+        # No face detected or analysis failed
+        return None
+
+
+_batch_supported = True
+
+
+def analyze_batch(DeepFace, frames, **analyze_kwargs):
+    """
+    Run emotion analysis on a list of frames with one DeepFace call.
+    Returns one face result (or None) per frame, in input order.
+    Falls back to per-frame calls if the installed DeepFace has no batch input.
+    """
+    global _batch_supported
+    if len(frames) > 1 and _batch_supported:
+        try:
+            results = DeepFace.analyze(
+                list(frames),
+                actions=["emotion"],
+                enforce_detection=False,
+                silent=True,
+                **analyze_kwargs
+            )
+            if isinstance(results, list) and len(results) == len(frames):
+                return [_first_face(r) for r in results]
+            _batch_supported = False
+        except (TypeError, AttributeError):
+            # Older DeepFace versions only accept a single image
+            _batch_supported = False
+        except Exception:
+            # A bad frame fails the whole batch; retry frame by frame below
+            pass
+    return [analyze_frame(DeepFace, frame, **analyze_kwargs) for frame in frames]
+
+
+def _exact_add(partials, x):
+    """
+    Add x to a list of non-overlapping partial sums (the algorithm behind math.fsum).
+    math.fsum(partials) is then the correctly rounded total whatever the order
+    or grouping of additions, so sharded runs sum to exactly the sequential result.
+    """
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+def format_segment(label, start_sec, duration_sec, samples, score_sums):
+    """JSON form of one run of samples sharing the same dominant label"""
+    return {
+        "emotion": label,
+        "start_sec": round(start_sec, 2),
+        "end_sec": round(start_sec + duration_sec, 2),
+        "duration_sec": round(duration_sec, 2),
+        "samples": samples,
+        "mean_scores": {e: round(score_sums[e] / samples, 2) for e in EMOTION_KEYS}
+                       if label not in ("no_face", "unknown") else {}
+    }
+
+
+def longest_segment(segments):
+    """Longest continuous run of a real emotion (ignores no_face/unknown runs)"""
+    runs = [seg for seg in segments if seg["emotion"] in EMOTION_KEYS]
+    if not runs:
+        return {"emotion": None, "start_sec": None, "end_sec": None, "duration_sec": 0.0}
+    best = max(runs, key=lambda seg: seg["duration_sec"])
+    return {key: best[key] for key in ("emotion", "start_sec", "end_sec", "duration_sec")}
+
+
+class SegmentBuilder:
+    """
+    Run-length encodes sampled frames into segments of the same dominant label:
+    (emotion, start_sec, end_sec, mean_scores). Each sample adds the seconds it
+    stands for, so segment durations add up to emotion_durations_sec. The
+    longest segment is summary.longest_continuous_emotion, and
+    --timeline-format segments outputs the list as emotions_timeline.
+    """
+
+    def __init__(self):
+        # [label, start_sec, duration partials, samples, {emotion: score partials}]
+        self.runs = []
+
+    def add(self, label, timestamp_sec, scores, interval_sec):
+        if not self.runs or self.runs[-1][0] != label:
+            self.runs.append([label, timestamp_sec, [], 0, {e: [] for e in EMOTION_KEYS}])
+        run = self.runs[-1]
+        _exact_add(run[2], interval_sec)
+        run[3] += 1
+        for e in EMOTION_KEYS:
+            _exact_add(run[4][e], float(scores.get(e, 0.0)))
+
+    def extend(self, runs):
+        """Append runs that follow these ones, joining a run split at the boundary"""
+        runs = list(runs)
+        if runs and self.runs and self.runs[-1][0] == runs[0][0]:
+            last, first = self.runs[-1], runs.pop(0)
+            for x in first[2]:
+                _exact_add(last[2], x)
+            last[3] += first[3]
+            for e in EMOTION_KEYS:
+                for x in first[4][e]:
+                    _exact_add(last[4][e], x)
+        self.runs.extend(runs)
+
+    def output(self):
+        return [
+            format_segment(label, start, math.fsum(duration), samples,
+                           {e: math.fsum(sums[e]) for e in EMOTION_KEYS})
+            for label, start, duration, samples, sums in self.runs
+        ]
+
+
+class EmotionAccumulator:
+    """Builds the emotions timeline and summary accumulators from per-frame results"""
+
+    def __init__(self, on_frame=None, keep_timeline=True, segments_timeline=False):
+        self.emotions_timeline = []
+        self.on_frame = on_frame  # called with each timeline entry as it is recorded
+        self.keep_timeline = keep_timeline and not segments_timeline
+        self.segments_timeline = segments_timeline  # output segments instead of frames
+        self.segments = SegmentBuilder()
+        self.analyzed_count = 0
+        self.faces_detected = 0
+
+        # Accumulators for average scores (exact partial sums, see _exact_add)
+        self.score_sums = {e: [] for e in EMOTION_KEYS}
+        self.dominant_counts = {e: 0 for e in EMOTION_KEYS}
+        # Track durations: consecutive frames with same dominant emotion
+        self.duration_tracker = {e: [] for e in EMOTION_KEYS}
+
+    def add(self, frame_idx, timestamp_sec, face_result, interval_sec):
+        """Record one sampled frame; face_result is None when no face was found"""
+        self.analyzed_count += 1
+
+        if face_result is None:
+            self._record({
+                "frame": frame_idx,
+                "timestamp_sec": timestamp_sec,
+                "dominant_emotion": "no_face",
+                "scores": {}
+            })
+            self.segments.add("no_face", timestamp_sec, {}, interval_sec)
+            return
+
+        emotion_scores = face_result.get("emotion", {})
+        dominant = face_result.get("dominant_emotion", "unknown")
+
+        # Round scores to 2 decimals
+        rounded_scores = {k: round(v, 2) for k, v in emotion_scores.items()}
+
+        self._record({
+            "frame": frame_idx,
+            "timestamp_sec": timestamp_sec,
+            "dominant_emotion": dominant,
+            "scores": rounded_scores
+        })
+
+        self.faces_detected += 1
+
+        # Accumulate for summary
+        for e in EMOTION_KEYS:
+            _exact_add(self.score_sums[e], float(emotion_scores.get(e, 0.0)))
+        if dominant in self.dominant_counts:
+            self.dominant_counts[dominant] += 1
+
+        # Duration tracking: each sampled frame represents interval_sec seconds
+        if dominant in self.duration_tracker:
+            _exact_add(self.duration_tracker[dominant], interval_sec)
+        self.segments.add(dominant if dominant in EMOTION_KEYS else "unknown",
+                          timestamp_sec, emotion_scores, interval_sec)
+
+    def _record(self, entry):
+        if self.keep_timeline:
+            self.emotions_timeline.append(entry)
+        if self.on_frame:
+            self.on_frame(entry)
+
+    def state(self):
+        """Picklable snapshot of the accumulators and timeline"""
+        return {
+            "analyzed_count": self.analyzed_count,
+            "faces_detected": self.faces_detected,
+            "score_sums": self.score_sums,
+            "dominant_counts": self.dominant_counts,
+            "duration_tracker": self.duration_tracker,
+            "segments": self.segments.runs,
+            "emotions_timeline": self.emotions_timeline
+        }
+
+    def merge(self, state):
+        """Append the state of an accumulator that covered the following frames"""
+        self.analyzed_count += state["analyzed_count"]
+        self.faces_detected += state["faces_detected"]
+        for e in EMOTION_KEYS:
+            for x in state["score_sums"][e]:
+                _exact_add(self.score_sums[e], x)
+            for x in state["duration_tracker"][e]:
+                _exact_add(self.duration_tracker[e], x)
+            self.dominant_counts[e] += state["dominant_counts"][e]
+        self.segments.extend(state["segments"])
+        for entry in state["emotions_timeline"]:
+            self._record(entry)
+
+    def _totals(self):
+        """(score_sums, dominant_counts, duration_tracker) as plain per-emotion totals"""
+        score_sums = {e: math.fsum(self.score_sums[e]) for e in EMOTION_KEYS}
+        duration_tracker = {e: math.fsum(self.duration_tracker[e]) for e in EMOTION_KEYS}
+        return score_sums, self.dominant_counts, duration_tracker
+
+    def _segments(self):
+        return self.segments.output()
+
+    def _timeline_output(self, segments):
+        return segments if self.segments_timeline else self.emotions_timeline
+
+    def build_output(self, fps, total_frames):
+        """Build the final JSON-ready result"""
+        faces_detected = self.faces_detected
+        score_sums, dominant_counts, duration_tracker = self._totals()
+        segments = self._segments()
 
-        # Build summary
         average_scores = {}
         if faces_detected > 0:
-            average_scores = {e: round(score_sums[e] / faces_detected, 2) for e in emotion_keys}
+            average_scores = {e: round(score_sums[e] / faces_detected, 2) for e in EMOTION_KEYS}
 
         # Emotion distribution as percentages
         emotion_distribution = {}
         if faces_detected > 0:
             emotion_distribution = {
                 e: round((dominant_counts[e] / faces_detected) * 100, 1)
-                for e in emotion_keys if dominant_counts[e] > 0
+                for e in EMOTION_KEYS if dominant_counts[e] > 0
             }
 
         # Round durations
         emotion_durations_sec = {
             e: round(duration_tracker[e], 2)
-            for e in emotion_keys if duration_tracker[e] > 0
+            for e in EMOTION_KEYS if duration_tracker[e] > 0
         }
 
         # Find the emotion shown for the longest time
@@ -173,26 +787,954 @@ def main():
 
         video_duration_sec = round(total_frames / fps, 2) if fps > 0 else 0
 
-        output = {
+        return {
             "video_duration_sec": video_duration_sec,
             "fps": round(fps, 2),
             "total_frames": total_frames,
-            "analyzed_frames": analyzed_count,
+            "analyzed_frames": self.analyzed_count,
             "faces_detected": faces_detected,
-            "emotions_timeline": emotions_timeline,
+            "emotions_timeline": self._timeline_output(segments),
             "summary": {
                 "dominant_emotion_overall": dominant_overall,
                 "longest_emotion": {
                     "emotion": longest_emotion,
                     "duration_sec": round(longest_duration, 2)
                 },
+                "longest_continuous_emotion": longest_segment(segments),
+                "segment_count": len(segments),
                 "emotion_distribution_percent": emotion_distribution,
                 "emotion_durations_sec": emotion_durations_sec,
                 "average_scores": average_scores
             }
         }
 
-        print(json.dumps(output, default=lambda x: float(x) if hasattr(x, 'item') else str(x)))
+
+class ColumnarAccumulator(EmotionAccumulator):
+    """
+    Same interface as EmotionAccumulator, but the timeline is held as NumPy
+    columns: frame (int32), timestamp_sec, dominant (uint8 code into
+    TIMELINE_LABELS), scores (float32, one EMOTION_KEYS row per frame) and
+    the seconds each sample stands for. The summary is computed from the
+    columns in one vectorized pass. The timeline is output as JSON arrays, or
+    written to an .npz sidecar when npz_path is set. Every row is kept, so a
+    timeline that is only streamed uses EmotionAccumulator instead (see
+    make_accumulator).
+    """
+
+    def __init__(self, on_frame=None, npz_path=None):
+        super().__init__(on_frame=on_frame)
+        self.segments = None  # derived from the columns in _segments()
+        import numpy as np
+        self.np = np
+        self.npz_path = npz_path
+        self.size = 0
+        self.columns = self._empty(256)
+
+    def _empty(self, capacity):
+        np = self.np
+        return {
+            "frame": np.zeros(capacity, dtype=np.int32),
+            "timestamp_sec": np.zeros(capacity, dtype=np.float64),
+            "dominant": np.zeros(capacity, dtype=np.uint8),
+            "scores": np.zeros((capacity, len(EMOTION_KEYS)), dtype=np.float32),
+            "interval_sec": np.zeros(capacity, dtype=np.float64)
+        }
+
+    def _reserve(self, extra):
+        capacity = len(self.columns["frame"])
+        if self.size + extra <= capacity:
+            return
+        while capacity < self.size + extra:
+            capacity *= 2
+        grown = self._empty(capacity)
+        for key, column in self.columns.items():
+            grown[key][:self.size] = column[:self.size]
+        self.columns = grown
+
+    def _entry(self, i):
+        """Per-frame dict entry for row i, as EmotionAccumulator would record it"""
+        c = self.columns
+        code = int(c["dominant"][i])
+        entry = {
+            "frame": int(c["frame"][i]),
+            "timestamp_sec": float(c["timestamp_sec"][i]),
+            "dominant_emotion": TIMELINE_LABELS[code],
+            "scores": {}
+        }
+        if code != NO_FACE_CODE:
+            entry["scores"] = {e: round(float(v), 2) for e, v in zip(EMOTION_KEYS, c["scores"][i])}
+        return entry
+
+    def add(self, frame_idx, timestamp_sec, face_result, interval_sec):
+        """Record one sampled frame; face_result is None when no face was found"""
+        self.analyzed_count += 1
+        self._reserve(1)
+        i, c = self.size, self.columns
+        c["frame"][i] = frame_idx
+        c["timestamp_sec"][i] = timestamp_sec
+        c["interval_sec"][i] = interval_sec
+        if face_result is None:
+            c["dominant"][i] = NO_FACE_CODE
+            c["scores"][i] = 0.0
+        else:
+            emotion_scores = face_result.get("emotion", {})
+            dominant = face_result.get("dominant_emotion", "unknown")
+            c["dominant"][i] = EMOTION_KEYS.index(dominant) if dominant in EMOTION_KEYS else UNKNOWN_CODE
+            c["scores"][i] = [emotion_scores.get(e, 0.0) for e in EMOTION_KEYS]
+            self.faces_detected += 1
+        self.size += 1
+        if self.on_frame:
+            self.on_frame(self._entry(i))
+
+    def state(self):
+        """Picklable snapshot of the columns"""
+        return {
+            "analyzed_count": self.analyzed_count,
+            "faces_detected": self.faces_detected,
+            "columns": {key: column[:self.size].copy() for key, column in self.columns.items()}
+        }
+
+    def merge(self, state):
+        """Append the state of an accumulator that covered the following frames"""
+        rows = state["columns"]
+        n = len(rows["frame"])
+        self._reserve(n)
+        for key, column in rows.items():
+            self.columns[key][self.size:self.size + n] = column
+        first = self.size
+        self.size += n
+        self.analyzed_count += state["analyzed_count"]
+        self.faces_detected += state["faces_detected"]
+        if self.on_frame:
+            for i in range(first, self.size):
+                self.on_frame(self._entry(i))
+
+    def _totals(self):
+        np = self.np
+        n = len(EMOTION_KEYS)
+        codes = self.columns["dominant"][:self.size]
+        has_face = codes != NO_FACE_CODE
+        is_emotion = codes < n
+        sums = self.columns["scores"][:self.size][has_face].sum(axis=0, dtype=np.float64)
+        counts = np.bincount(codes[is_emotion], minlength=n)
+        durations = np.bincount(codes[is_emotion],
+                                weights=self.columns["interval_sec"][:self.size][is_emotion],
+                                minlength=n)
+        return (
+            {e: float(sums[k]) for k, e in enumerate(EMOTION_KEYS)},
+            {e: int(counts[k]) for k, e in enumerate(EMOTION_KEYS)},
+            {e: float(durations[k]) for k, e in enumerate(EMOTION_KEYS)}
+        )
+
+    def _segments(self):
+        np = self.np
+        n = self.size
+        if n == 0:
+            return []
+        codes = self.columns["dominant"][:n]
+        starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+        samples = np.diff(np.concatenate((starts, [n])))
+        durations = np.add.reduceat(self.columns["interval_sec"][:n], starts)
+        score_sums = np.add.reduceat(self.columns["scores"][:n].astype(np.float64), starts, axis=0)
+        return [
+            format_segment(TIMELINE_LABELS[codes[start]], float(self.columns["timestamp_sec"][start]),
+                           float(durations[k]), int(samples[k]),
+                           {e: float(score_sums[k][j]) for j, e in enumerate(EMOTION_KEYS)})
+            for k, start in enumerate(starts)
+        ]
+
+    def _timeline_output(self, segments):
+        np = self.np
+        c = {key: column[:self.size] for key, column in self.columns.items()}
+        if self.npz_path:
+            np.savez_compressed(
+                self.npz_path,
+                frame=c["frame"],
+                timestamp_sec=c["timestamp_sec"],
+                dominant=c["dominant"],
+                scores=c["scores"],
+                labels=np.array(TIMELINE_LABELS)
+            )
+            return {"format": "columnar", "length": self.size, "npz": self.npz_path}
+        return {
+            "format": "columnar",
+            "length": self.size,
+            "labels": TIMELINE_LABELS,
+            "emotions": EMOTION_KEYS,
+            "frame": c["frame"].tolist(),
+            "timestamp_sec": c["timestamp_sec"].tolist(),
+            "dominant": c["dominant"].tolist(),
+            "scores": np.round(c["scores"].astype(np.float64), 2).tolist()
+        }
+
+
+def make_accumulator(timeline_format="dict", npz_path=None, on_frame=None, keep_timeline=True):
+    """
+    Create the accumulator for the requested timeline format. Without
+    keep_timeline (--stream) and without an .npz sidecar to write there are
+    no columns to hold, so columnar falls back to running totals and memory
+    stays flat.
+    """
+    if timeline_format == "columnar" and (keep_timeline or npz_path):
+        return ColumnarAccumulator(on_frame=on_frame, npz_path=npz_path)
+    return EmotionAccumulator(on_frame=on_frame, keep_timeline=keep_timeline,
+                              segments_timeline=timeline_format == "segments")
+
+
+def _needs_inference(image):
+    return image is not None and not isinstance(image, ReusedResult)
+
+
+def run_batch(DeepFace, batch, analyze_kwargs):
+    """
+    Analyze a batch of (frame_idx, timestamp_sec, image); image None means no
+    face, and a ReusedResult image is passed through as the result.
+    """
+    images = [image for _, _, image in batch if _needs_inference(image)]
+    results = iter(analyze_batch(DeepFace, images, **analyze_kwargs) if images else [])
+    return [next(results) if _needs_inference(image) else image for _, _, image in batch]
+
+
+def load_backend(spec=None):
+    """
+    The emotion backend object: the DeepFace module itself, or an OnnxEmotion
+    with the same analyze()/extract_faces() interface (see onnx_emotion.py).
+    """
+    if not spec or spec.get("backend", "deepface") == "deepface":
+        from deepface import DeepFace
+        return DeepFace
+    from onnx_emotion import OnnxEmotion
+    return OnnxEmotion(model_path=spec.get("onnx_model"), detector_path=spec.get("onnx_detector"),
+                       threads=spec.get("onnx_threads") or 0)
+
+
+_worker_deepface = None
+
+
+def _init_process_worker(backend_spec=None):
+    """Load the emotion backend once per worker process"""
+    global _worker_deepface
+    _worker_deepface = load_backend(backend_spec)
+
+
+def _run_batch_in_process(batch, analyze_kwargs):
+    return run_batch(_worker_deepface, batch, analyze_kwargs)
+
+
+def iter_batches(frames, fps, batch_size, tracker=None, dedup=None):
+    """
+    Group sampled frames into batches of (frame_idx, timestamp_sec, image).
+    With a FrameDeduplicator, near-duplicate images are replaced by REUSED.
+    """
+    batch = []
+    for frame_idx, frame in frames:
+        timestamp_sec = round(frame_idx / fps, 2)
+        image = tracker.crop(frame) if tracker else frame
+        if dedup:
+            if image is None:
+                dedup.reset()
+            elif dedup.is_duplicate(image):
+                image = REUSED
+        batch.append((frame_idx, timestamp_sec, image))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _queue_put(q, item, stop):
+    """Blocking put that gives up once stop is set"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _decode_worker(batches, q, stop, errors):
+    try:
+        for batch in batches:
+            if stop.is_set():
+                return
+            _queue_put(q, batch, stop)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _queue_put(q, None, stop)
+
+
+def iter_pipelined(batches, DeepFace, analyze_kwargs, workers, worker_type="thread",
+                   queue_size=DEFAULT_QUEUE_SIZE, backend_spec=None):
+    """
+    Yield (batch, results) in frame order while a decoder thread and a worker
+    pool overlap decoding with inference. At most queue_size decoded batches
+    plus 2 * workers in-flight batches are held, whatever the video length.
+    """
+    q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    decoder = threading.Thread(target=_decode_worker, args=(batches, q, stop, errors), daemon=True)
+
+    if worker_type == "process":
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker,
+                                   initargs=(backend_spec,))
+        submit = lambda batch: pool.submit(_run_batch_in_process, batch, analyze_kwargs)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda batch: pool.submit(run_batch, DeepFace, batch, analyze_kwargs)
+
+    in_flight = deque()  # (batch, future) in submission (= frame) order
+    decoder.start()
+    try:
+        while True:
+            batch = q.get()
+            if batch is None:
+                break
+            in_flight.append((batch, submit(batch)))
+            while len(in_flight) >= workers * 2:
+                done_batch, future = in_flight.popleft()
+                yield done_batch, future.result()
+        while in_flight:
+            done_batch, future = in_flight.popleft()
+            yield done_batch, future.result()
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        decoder.join()
+        for _, future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def analyze_range(cv2, DeepFace, cap, fps, acc, start=0, end=0, total_frames=0,
+                  batch_size=1, sample_interval=DEFAULT_SAMPLE_INTERVAL_SEC, sampler="grab",
+                  track=False, track_min_confidence=TRACK_MIN_CONFIDENCE,
+                  detector_backend="opencv", adaptive=False,
+                  adaptive_max_interval=ADAPTIVE_MAX_INTERVAL_SEC,
+                  adaptive_threshold=ADAPTIVE_THRESHOLD,
+                  workers=1, worker_type="thread", queue_size=DEFAULT_QUEUE_SIZE,
+                  backend_spec=None, checkpointer=None, resume=None, deadline=None,
+                  frame_estimate=0, reuse_threshold=None, cancel=None):
+    """
+    Analyze the sampled frames of [start, end) into acc. end=0 runs to the end
+    of the video; total_frames=0 means the frame count is unknown.
+    With a checkpointer, the run state is saved every few seconds after a
+    completed batch; `resume` is such a saved state (acc already restored by
+    the caller, sampling continues from resume["next_frame"]).
+    With a deadline (time.time() value) a BudgetController thins out sampling
+    to finish in time; frame_estimate stands in for an unknown frame count.
+    With reuse_threshold, near-duplicate samples (see FrameDeduplicator) take
+    the result of the last analyzed sample instead of running inference.
+    cancel (a threading.Event) is checked after every batch; once set, the
+    run stops with JobCancelled, leaving its checkpoint for a later retry.
+    Returns picklable run stats: frames_seen, tracking counts, adaptive steps,
+    budget figures, reused frames.
+    """
+    step = max(1, round(sample_interval * fps))
+    scheduler = None
+    if adaptive:
+        scheduler = AdaptiveScheduler(step, round(adaptive_max_interval * fps),
+                                      threshold=adaptive_threshold)
+        step = scheduler.step
+    frames = FrameSampler(cv2, cap, fps, step, strategy=sampler,
+                          total_frames=total_frames, start=start, end=end)
+    tracker = None
+    analyze_kwargs = {}
+    if track:
+        tracker = FaceTracker(cv2, DeepFace, detector_backend=detector_backend,
+                              min_confidence=track_min_confidence)
+        analyze_kwargs["detector_backend"] = "skip"
+    dedup = FrameDeduplicator(cv2, reuse_threshold) if reuse_threshold is not None else None
+    reuse = {"last_result": None, "reused": 0}
+    # With a budget, the last sample of each batch is held until the next one is
+    # taken: a widened step reaches the sampler only after the batches already
+    # decoded (--workers), so only the next sample tells how long it stands for
+    held = []
+
+    budget = None
+    end_frame = end or total_frames or frame_estimate
+    if deadline:
+        budget = BudgetController(deadline, scheduler.min_step if scheduler else step, end_frame)
+
+    if resume:
+        if budget and resume.get("budget"):
+            budget.restore(resume["budget"])
+        if scheduler and resume["scheduler"]:
+            scheduler.restore(resume["scheduler"])
+            frames.step = scheduler.step
+        if tracker and resume["tracker"]:
+            tracker.restore(resume["tracker"])
+        if dedup and resume.get("reuse"):
+            reuse.update(resume["reuse"]["state"])
+            dedup.reference = resume["reuse"]["reference"]
+        held.extend(resume.get("held") or [])
+
+    # In pipelined mode the decoder runs ahead of the recorded frames, so its
+    # state (tracker, hash reference, frames walked) is snapshotted with every
+    # batch and a checkpoint saves the one of the last recorded batch
+    decoded = {}  # last frame of a batch in flight -> decode_state() after it
+
+    def decode_state():
+        return {
+            "frames_seen": frames.frames_seen,
+            "tracker": tracker.state() if tracker else None,
+            "reference": dedup.reference if dedup else None
+        }
+
+    def snapshot_batches(batches):
+        for batch in batches:
+            decoded[batch[-1][0]] = decode_state()
+            yield batch
+
+    def checkpoint(next_frame, state=None):
+        state = state or decode_state()
+        checkpointer.save({
+            "next_frame": next_frame,
+            "frames_seen": state["frames_seen"],
+            "acc": acc.state(),
+            "scheduler": scheduler.state() if scheduler else None,
+            "tracker": state["tracker"],
+            "budget": budget.state() if budget else None,
+            "reuse": {"state": dict(reuse), "reference": state["reference"]} if dedup else None,
+            "held": list(held)
+        })
+
+    def credit(idx, ts, face_result, next_idx=None):
+        """Add one sample, standing for the time until next_idx (default: one step on)"""
+        if next_idx is None:
+            next_idx = idx + frames.step
+        elif budget and not scheduler:
+            budget.max_step = max(budget.max_step, next_idx - idx)
+        if (scheduler or budget) and total_frames:
+            # Large adaptive/budget steps would otherwise credit time past the end
+            next_idx = min(next_idx, max(total_frames, idx + 1))
+        acc.add(idx, ts, face_result, (next_idx - idx) / fps)
+        return next_idx
+
+    def record(batch, results):
+        state = decoded.pop(batch[-1][0], None)
+        if budget:
+            budget_step = budget.observe(len(batch), batch[-1][0] + frames.step)
+            if scheduler:
+                # Applies from the very next sample; adaptive gaps themselves are not a reduction
+                scheduler.min_step = budget_step
+                scheduler.max_step = max(scheduler.max_step, budget_step)
+                budget.max_step = max(budget.max_step, budget_step)
+            else:
+                frames.step = budget_step
+        samples = list(held)
+        for (idx, ts, _), face_result in zip(batch, results):
+            if isinstance(face_result, ReusedResult):
+                face_result = reuse["last_result"]
+                reuse["reused"] += 1
+            else:
+                reuse["last_result"] = face_result
+            if scheduler:
+                frames.step = scheduler.observe(face_result)
+            samples.append((idx, ts, face_result))
+        held[:] = samples[-1:] if budget else []
+        # Each sample stands for the time until the next one
+        for i in range(len(samples) - len(held)):
+            credit(*samples[i], next_idx=samples[i + 1][0] if i + 1 < len(samples) else None)
+        if checkpointer and checkpointer.due():
+            checkpoint(batch[-1][0] + frames.step, state)
+
+    batches = iter_batches(frames, fps, batch_size, tracker=tracker, dedup=dedup)
+    if workers > 1:
+        batches = snapshot_batches(batches)
+        for batch, results in iter_pipelined(batches, DeepFace, analyze_kwargs, workers,
+                                             worker_type=worker_type, queue_size=queue_size,
+                                             backend_spec=backend_spec):
+            record(batch, results)
+            if cancel and cancel.is_set():
+                raise JobCancelled("Job cancelled")
+            if budget and budget.should_stop(batch_size, batch[-1][0] + frames.step):
+                break
+    else:
+        # The sampler is lazy, so an adaptive step change applies to the very next frame
+        for batch in batches:
+            record(batch, run_batch(DeepFace, batch, analyze_kwargs))
+            if cancel and cancel.is_set():
+                raise JobCancelled("Job cancelled")
+            if budget and budget.should_stop(batch_size, batch[-1][0] + frames.step):
+                break
+
+    covered_until = start
+    if held:
+        # Past the last sample: the rest of the video, or after an early stop
+        # only the normal spacing, since no later sample was taken
+        idx, ts, face_result = held.pop()
+        covered_until = credit(idx, ts, face_result,
+                               idx + budget.base_step if budget.stopped_early else None)
+
+    return {
+        "frames_seen": max(frames.frames_seen, resume["frames_seen"] if resume else 0),
+        "tracking": {
+            "face_detections": tracker.detections,
+            "tracked_frames": tracker.tracked
+        } if tracker else None,
+        "adaptive_steps": (scheduler.min_step, scheduler.max_step) if scheduler else None,
+        "budget": {
+            "stopped_early": budget.stopped_early,
+            # Frames of [start, end) credited to a sample; all of them unless stopped early
+            "covered_frames": max(0, (min(covered_until, end_frame) if end_frame else covered_until) - start),
+            "base_step": budget.base_step,
+            "max_step": budget.max_step
+        } if budget else None,
+        "reused_frames": reuse["reused"] if dedup else None
+    }
+
+
+def shard_ranges(total_frames, step, shards):
+    """Split [0, total_frames) into up to `shards` frame ranges that start on sample boundaries"""
+    n_samples = -(-total_frames // step)
+    shards = max(1, min(shards, n_samples))
+    bounds = [round(k * n_samples / shards) * step for k in range(shards + 1)]
+    bounds[-1] = total_frames
+    return [(bounds[k], bounds[k + 1]) for k in range(shards) if bounds[k] < bounds[k + 1]]
+
+
+def _analyze_shard(video_path, fps, start, end, total_frames, timeline_format, options):
+    """Process-pool entry point: analyze one frame range with its own VideoCapture"""
+    import cv2
+    DeepFace = load_backend(options.get("backend_spec"))
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    acc = make_accumulator(timeline_format)
+    try:
+        stats = analyze_range(cv2, DeepFace, cap, fps, acc, start=start, end=end,
+                              total_frames=total_frames, **options)
+    finally:
+        cap.release()
+    return acc.state(), stats
+
+
+def analyze_video(cv2, DeepFace, video_path, shards=1, on_frame=None, keep_timeline=True,
+                  timeline_format="dict", npz_path=None, checkpointer=None,
+                  budget_seconds=None, started=None, cancel=None, **options):
+    """
+    Analyze a video and return the output dict. `options` are analyze_range
+    keyword arguments.
+    on_frame(entry) is called for each timeline entry in frame order; with
+    keep_timeline=False the timeline is only streamed, not returned.
+    With shards > 1 the video is split into time ranges analyzed in parallel
+    processes and merged in order; the result matches a sequential run
+    (except with reuse_threshold, where each shard starts a fresh reference).
+    Score and duration sums are exact partial sums, so the merge is exact.
+    Without an OpenCV frame count (common for WebM) the split is planned from
+    media_probe.py's metadata and the last shard runs to the end.
+    timeline_format="columnar" keeps the timeline as NumPy columns (optionally
+    written to npz_path) instead of per-frame dicts.
+    With a checkpointer (see checkpoint_store.py) an unsharded run resumes
+    from the last checkpoint and clears it when done.
+    With budget_seconds, the run aims to finish that long after `started`
+    (time.time(), default now) and reports its coverage under "budget".
+    Setting the cancel event stops the run with JobCancelled (sharded runs
+    after the shards already running).
+    """
+    started = started or time.time()
+    if timeline_format == "columnar" and not (keep_timeline or npz_path):
+        timeline_format = "dict"  # shard states must match the accumulator make_accumulator picks
+    cap, fps, total_frames, count_frames = open_video(cv2, video_path)
+    acc = make_accumulator(timeline_format, npz_path=npz_path,
+                           on_frame=on_frame, keep_timeline=keep_timeline)
+
+    # Without a frame count from OpenCV, plan shards from the container metadata;
+    # the last shard then runs to the end of the video and the count is still taken from decoding
+    planned_frames = total_frames
+    if count_frames and (shards > 1 or budget_seconds):
+        planned_frames = video_frame_estimate(probe_media(video_path))
+    if budget_seconds:
+        options = dict(options, deadline=started + budget_seconds,
+                       frame_estimate=planned_frames if count_frames else 0)
+    if shards > 1 and count_frames:
+        if not planned_frames:
+            print("[deepface_analyze] frame count unknown, analyzing without shards", file=sys.stderr)
+            shards = 1
+
+    if shards > 1:
+        cap.release()
+        step = max(1, round(options.get("sample_interval", DEFAULT_SAMPLE_INTERVAL_SEC) * fps))
+        ranges = shard_ranges(planned_frames, step, shards)
+        if count_frames:
+            ranges[-1] = (ranges[-1][0], 0)
+        tracking = None
+        budget = None
+        reused_frames = None
+        frames_seen = total_frames
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [
+                pool.submit(_analyze_shard, video_path, fps, start, end, total_frames,
+                            timeline_format, options)
+                for start, end in ranges
+            ]
+            for future in futures:
+                if cancel and cancel.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    raise JobCancelled("Job cancelled")
+                state, stats = future.result()
+                acc.merge(state)
+                frames_seen = max(frames_seen, stats["frames_seen"])
+                if stats["reused_frames"] is not None:
+                    reused_frames = (reused_frames or 0) + stats["reused_frames"]
+                if stats["tracking"]:
+                    tracking = tracking or {"face_detections": 0, "tracked_frames": 0}
+                    for key in tracking:
+                        tracking[key] += stats["tracking"][key]
+                if stats["budget"]:
+                    shard_budget = stats["budget"]
+                    budget = budget or dict(shard_budget, stopped_early=False, covered_frames=0)
+                    budget["stopped_early"] |= shard_budget["stopped_early"]
+                    budget["covered_frames"] += shard_budget["covered_frames"]
+                    budget["max_step"] = max(budget["max_step"], shard_budget["max_step"])
+        stats = {"frames_seen": frames_seen, "tracking": tracking, "adaptive_steps": None,
+                 "budget": budget, "reused_frames": reused_frames}
+    else:
+        resume = checkpointer.load() if checkpointer else None
+        if resume:
+            acc.merge(resume["acc"])
+            print(f"[deepface_analyze] resuming from frame {resume['next_frame']}", file=sys.stderr)
+        try:
+            stats = analyze_range(cv2, DeepFace, cap, fps, acc,
+                                  start=resume["next_frame"] if resume else 0,
+                                  total_frames=0 if count_frames else total_frames,
+                                  checkpointer=checkpointer, resume=resume, cancel=cancel, **options)
+        finally:
+            cap.release()
+        if checkpointer:
+            checkpointer.clear()
+
+    # Update total_frames if we were counting
+    if count_frames:
+        total_frames = stats["frames_seen"]
+        if stats["budget"] and stats["budget"]["stopped_early"]:
+            # Decoding stopped before the end; the container estimate is closer
+            total_frames = max(total_frames, planned_frames)
+
+    output = acc.build_output(fps, total_frames)
+    if not keep_timeline and timeline_format != "segments":
+        del output["emotions_timeline"]
+    if stats["adaptive_steps"]:
+        min_step, max_step = stats["adaptive_steps"]
+        output["sampling"] = {
+            "mode": "adaptive",
+            "analyzed_frames": acc.analyzed_count,
+            "fixed_rate_frames": -(-total_frames // min_step),
+            "min_interval_sec": round(min_step / fps, 3),
+            "max_interval_sec": round(max_step / fps, 3)
+        }
+    if stats["tracking"]:
+        output["tracking"] = stats["tracking"]
+    if shards > 1:
+        output["sharding"] = {"shards": len(ranges)}
+    if stats["reused_frames"] is not None:
+        output["reuse"] = {
+            "threshold_bits": options.get("reuse_threshold"),
+            "reused_frames": stats["reused_frames"],
+            "inferred_frames": acc.analyzed_count - stats["reused_frames"]
+        }
+    if stats["budget"]:
+        budget = stats["budget"]
+        covered = total_frames if not budget["stopped_early"] else min(total_frames, budget["covered_frames"])
+        output["budget"] = {
+            "budget_seconds": budget_seconds,
+            "elapsed_sec": round(time.time() - started, 2),
+            "stopped_early": budget["stopped_early"],
+            "reduced_sampling": budget["max_step"] > budget["base_step"],
+            "coverage_percent": round(100 * covered / total_frames, 1) if total_frames else 0.0,
+            "covered_sec": round(covered / fps, 2),
+            # Mean spacing of the analyzed samples over the covered part of the video
+            "effective_sample_interval_sec": round(covered / fps / acc.analyzed_count, 3)
+                                             if acc.analyzed_count else None,
+            "max_sample_interval_sec": round(budget["max_step"] / fps, 3)
+        }
+    return output
+
+
+def budget_limited(output):
+    """True for a best-effort result that ran out of budget (not cached)"""
+    budget = output.get("budget")
+    return bool(budget and (budget["stopped_early"] or budget["reduced_sampling"]))
+
+
+def analysis_options(args):
+    """Map parsed CLI options to analyze_video keyword arguments"""
+    return {
+        "shards": args.shards,
+        "timeline_format": args.timeline_format,
+        "npz_path": args.npz_path,
+        "batch_size": args.batch_size,
+        "sample_interval": args.sample_interval,
+        "sampler": args.sampler,
+        "track": args.track,
+        "track_min_confidence": args.track_min_confidence,
+        "detector_backend": args.detector_backend,
+        "adaptive": args.adaptive,
+        "adaptive_max_interval": args.adaptive_max_interval,
+        "adaptive_threshold": args.adaptive_threshold,
+        "workers": args.workers,
+        "worker_type": args.worker_type,
+        "queue_size": args.queue_size,
+        "backend_spec": backend_spec(args),
+        "budget_seconds": args.budget_seconds,
+        "reuse_threshold": args.reuse_threshold
+    }
+
+
+def backend_spec(args):
+    """Picklable description of the emotion backend, for worker processes"""
+    return {
+        "backend": args.backend,
+        "onnx_model": args.onnx_model,
+        "onnx_detector": args.onnx_detector,
+        "onnx_threads": args.onnx_threads
+    }
+
+
+def analysis_cache_key(video_path, args):
+    """Result cache key: video contents + DeepFace version + result-affecting options"""
+    params = {k: v for k, v in analysis_options(args).items() if k not in EXECUTION_OPTIONS}
+    if args.backend == "onnx":
+        from onnx_emotion import DEFAULT_MODEL_PATH
+        model_path = args.onnx_model or os.getenv("EMOTION_ONNX_MODEL") or DEFAULT_MODEL_PATH
+        version = f"{package_version('onnxruntime')}:{content_hash(model_path)}"
+        return cache_key(content_hash(video_path), "onnx-emotion", version, params)
+    return cache_key(content_hash(video_path), "deepface-emotion", package_version("deepface"), params)
+
+
+def cache_lookup(cache, args):
+    """(key, cached result) for a one-shot job; key is None when the job is not cacheable"""
+    # npz output is a side effect a cached JSON cannot reproduce
+    if cache is None or args.no_cache or args.npz_path:
+        return None, None
+    try:
+        key = analysis_cache_key(args.video_path, args)
+    except OSError:
+        return None, None  # missing file: let the analysis report it
+    return key, cache.get(key)
+
+
+def job_checkpointer(args):
+    """Checkpointer for a one-shot job, or None when checkpoints are off or do not apply"""
+    # Shards run in separate processes, and a streamed run has already sent its frames
+    if args.no_checkpoint or args.shards > 1 or args.stream:
+        return None
+    try:
+        key = analysis_cache_key(args.video_path, args)
+    except OSError:
+        return None
+    return open_checkpointer(key)
+
+
+def to_json(obj):
+    """Serialize output, converting numpy scalars"""
+    return json.dumps(obj, default=lambda x: float(x) if hasattr(x, 'item') else str(x))
+
+
+def warm_up(DeepFace):
+    """Build the detector and emotion model before the first job arrives"""
+    try:
+        import numpy as np
+        DeepFace.analyze(np.zeros((96, 96, 3), dtype=np.uint8), actions=["emotion"],
+                         enforce_detection=False, silent=True)
+    except Exception as e:
+        print(f"[deepface_analyze] warm-up failed: {e}", file=sys.stderr)
+
+
+def stream(cv2, DeepFace, args):
+    """
+    --stream: print NDJSON frame records as they are produced, then the summary
+    record (everything but emotions_timeline). The timeline is not kept in
+    memory, and a killed run leaves every finished frame on stdout.
+    """
+    def emit(record):
+        sys.stdout.write(to_json(record) + "\n")
+        sys.stdout.flush()
+
+    try:
+        output = analyze_video(
+            cv2, DeepFace, args.video_path,
+            on_frame=lambda entry: emit({"type": "frame", **entry}),
+            keep_timeline=False,
+            started=PROCESS_STARTED,
+            **analysis_options(args)
+        )
+        emit({"type": "summary", **output})
+    except Exception as e:
+        emit({"type": "error", "error": str(e)})
+        sys.exit(1)
+
+
+def serve(cv2, DeepFace, server_args):
+    """
+    Long-lived worker. Reads one JSON request per line from stdin:
+      {"id": 1, "video_path": "...", "args": ["--batch-size", "8"], "stream": false}
+      {"id": 2, "type": "health"}
+      {"id": 1, "type": "cancel"}  (stop job 1 after its current batch)
+      {"type": "shutdown"}
+    and writes one JSON line per request to stdout with the same id:
+      {"id": 1, "result": {...}}  or  {"id": 1, "error": "..."}
+      {"id": 2, "status": "ok", "active_jobs": 0, ...}
+    With "stream": true, {"id": 1, "type": "frame", ...} lines precede the
+    result, which then carries no emotions_timeline.
+    A job's --budget-seconds counts from when its request line was read, so
+    time spent queued behind other jobs is included.
+    Up to --server-jobs videos run concurrently. Shutdown (request, stdin EOF
+    or SIGTERM) stops reading and waits for running jobs to finish.
+    """
+    # Keep stray library prints off the protocol channel
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    out_lock = threading.Lock()
+    cache = open_cache()
+    stats = {"active_jobs": 0, "completed_jobs": 0, "failed_jobs": 0}
+    stats_lock = threading.Lock()
+    started = time.time()
+    cancels = {}  # job id -> threading.Event, while queued or running
+
+    def reply(message):
+        line = to_json(message)
+        with out_lock:
+            out.write(line + "\n")
+            out.flush()
+
+    def run_job(job_id, video_path, job_argv, stream, received, cancel):
+        with stats_lock:
+            stats["active_jobs"] += 1
+        failed = True
+        try:
+            if cancel.is_set():
+                raise JobCancelled("Job cancelled")
+            try:
+                args = parse_args(list(job_argv) + [video_path], defaults=server_args)
+            except SystemExit:
+                reply({"id": job_id, "error": f"Invalid job args: {job_argv}"})
+                return
+            key, result = cache_lookup(cache, args) if not stream else (None, None)
+            if result is None:
+                on_frame = None
+                if stream:
+                    on_frame = lambda entry: reply({"id": job_id, "type": "frame", **entry})
+                result = analyze_video(cv2, DeepFace, args.video_path, on_frame=on_frame,
+                                       keep_timeline=not stream,
+                                       checkpointer=None if stream else job_checkpointer(args),
+                                       started=received, cancel=cancel, **analysis_options(args))
+                if key and not budget_limited(result):
+                    cache.put(key, result)
+            reply({"id": job_id, "result": result})
+            failed = False
+        except Exception as e:
+            reply({"id": job_id, "error": str(e)})
+        finally:
+            with stats_lock:
+                stats["active_jobs"] -= 1
+                stats["failed_jobs" if failed else "completed_jobs"] += 1
+                if cancels.get(job_id) is cancel:
+                    del cancels[job_id]
+
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    warm_up(DeepFace)
+    reply({"type": "ready", "pid": os.getpid()})
+
+    pool = ThreadPoolExecutor(max_workers=max(1, server_args.server_jobs))
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                reply({"id": None, "error": "Invalid JSON request"})
+                continue
+
+            job_id = request.get("id")
+            kind = request.get("type", "analyze")
+            if kind == "shutdown":
+                break
+            if kind == "health":
+                with stats_lock:
+                    reply({"id": job_id, "status": "ok", **stats,
+                           "uptime_sec": round(time.time() - started, 1)})
+                continue
+            if kind == "cancel":
+                with stats_lock:
+                    cancel = cancels.get(job_id)
+                if cancel:
+                    cancel.set()
+                continue
+            if not request.get("video_path"):
+                reply({"id": job_id, "error": "No video path provided"})
+                continue
+            cancel = threading.Event()
+            with stats_lock:
+                cancels[job_id] = cancel
+            pool.submit(run_job, job_id, request["video_path"], request.get("args", []),
+                        bool(request.get("stream")), time.time(), cancel)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown(wait=True)
+        reply({"type": "shutdown"})
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if not args.video_path and not args.serve:
+        print(json.dumps({"error": "No video path provided"}))
+        sys.exit(1)
+
+    # A cache hit answers before TensorFlow/DeepFace are imported
+    cache, key = None, None
+    if not args.serve and not args.stream:
+        cache = open_cache(not args.no_cache)
+        key, cached = cache_lookup(cache, args)
+        if cached is not None:
+            print(to_json(cached))
+            return
+
+    try:
+        import cv2
+    except ImportError:
+        print(json.dumps({"error": "opencv-python not installed. Run: pip install opencv-python"}))
+        sys.exit(1)
+
+    try:
+        DeepFace = load_backend(backend_spec(args))
+    except ImportError:
+        if args.backend == "onnx":
+            print(json.dumps({"error": "onnxruntime not installed. Run: pip install onnxruntime"}))
+        else:
+            print(json.dumps({"error": "deepface not installed. Run: pip install deepface"}))
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    if args.serve:
+        serve(cv2, DeepFace, args)
+        return
+
+    if args.stream:
+        stream(cv2, DeepFace, args)
+        return
+
+    try:
+        output = analyze_video(cv2, DeepFace, args.video_path, checkpointer=job_checkpointer(args),
+                               started=PROCESS_STARTED, **analysis_options(args))
+        print(to_json(output))
+        if key and not budget_limited(output):
+            cache.put(key, output)
 
     except Exception as e:
         print(json.dumps({"error": str(e)}))
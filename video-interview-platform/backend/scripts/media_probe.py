@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Container metadata probe shared by deepface_analyze.py and whisper_transcribe.py.
+Usage: python media_probe.py <path>
+Output: JSON to stdout, see probe_media().
+
+Reads duration, fps, frame count and audio stream info with ffprobe (already
+installed with the ffmpeg that Whisper needs) from container headers only;
+nothing is decoded. Browser-recorded WebM often has no duration or frame
+count in its headers, in which case the video (or audio) packets are listed
+instead - still demux only, a small fraction of the cost of decoding.
+
+Results are memoized per process and stored in the result cache (see
+result_cache.py) under the file's path, size and mtime, so repeated runs on
+the same upload do not spawn ffprobe again.
+
+Environment:
+  FFPROBE_BIN  ffprobe executable (default: ffprobe on PATH)
+"""
+
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+from result_cache import open_cache, cache_key
+
+PROBE_VERSION = 1  # bump when the probe output changes, to invalidate cached probes
+PROBE_TIMEOUT_SEC = 60
+MAX_VALID_FPS = 240
+
+_probe_memo = {}
+
+
+def _ffprobe_bin():
+    return shutil.which(os.getenv("FFPROBE_BIN", "ffprobe"))
+
+
+def _run_ffprobe(args):
+    """Run ffprobe and return its stdout, or None if it fails"""
+    ffprobe = _ffprobe_bin()
+    if not ffprobe:
+        return None
+    try:
+        proc = subprocess.run([ffprobe, "-v", "error"] + args, capture_output=True,
+                              text=True, timeout=PROBE_TIMEOUT_SEC)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def _float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 and value == value else None
+
+
+def _rate(value):
+    """Frame rate from an ffprobe fraction such as "30000/1001", or None if unusable"""
+    try:
+        num, _, den = str(value).partition("/")
+        rate = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if 0 < rate <= MAX_VALID_FPS else None
+
+
+def _tag_duration(stream):
+    """Matroska per-stream DURATION tag ("HH:MM:SS.nnnnnnnnn"), in seconds"""
+    tag = (stream.get("tags") or {}).get("DURATION")
+    if not tag:
+        return None
+    try:
+        h, m, s = tag.split(":")
+        return _float(int(h) * 3600 + int(m) * 60 + float(s))
+    except ValueError:
+        return None
+
+
+def _scan_packets(path, selector):
+    """(packet count, end time in seconds) for one stream, demuxing without decoding"""
+    out = _run_ffprobe(["-select_streams", selector, "-show_entries", "packet=pts_time,duration_time",
+                        "-of", "csv=p=0", path])
+    if out is None:
+        return None, None
+    count = 0
+    end = 0.0
+    for line in out.splitlines():
+        fields = line.strip().split(",")
+        if not fields or not fields[0]:
+            continue
+        count += 1
+        pts = _float(fields[0]) or 0.0
+        duration = _float(fields[1]) if len(fields) > 1 else None
+        end = max(end, pts + (duration or 0.0))
+    return count or None, end or None
+
+
+def _probe(path):
+    out = _run_ffprobe(["-print_format", "json", "-show_format", "-show_streams", path])
+    if out is None:
+        return None
+    try:
+        info = json.loads(out)
+    except ValueError:
+        return None
+
+    fmt = info.get("format") or {}
+    streams = info.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    duration = _float(fmt.get("duration"))
+    result = {
+        "format": fmt.get("format_name"),
+        "duration_sec": None,
+        "duration_source": "header" if duration else None,
+        "has_video": video is not None,
+        "has_audio": audio is not None,
+        "video": None,
+        "audio": None
+    }
+
+    if video is not None:
+        fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+        frame_count = int(video["nb_frames"]) if str(video.get("nb_frames", "")).isdigit() else None
+        frame_count_source = "header" if frame_count else None
+        duration = duration or _float(video.get("duration")) or _tag_duration(video)
+        if not frame_count or not duration:
+            packets, end = _scan_packets(path, "v:0")
+            if packets and not frame_count:
+                frame_count, frame_count_source = packets, "packets"
+            if end and not duration:
+                duration, result["duration_source"] = end, "packets"
+        if not fps and frame_count and duration:
+            fps = frame_count / duration
+        if not frame_count and fps and duration:
+            frame_count, frame_count_source = round(fps * duration), "estimate"
+        result["video"] = {
+            "codec": video.get("codec_name"),
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "fps": round(fps, 3) if fps else None,
+            "frame_count": frame_count,
+            "frame_count_source": frame_count_source
+        }
+
+    if audio is not None:
+        audio_duration = _float(audio.get("duration")) or _tag_duration(audio)
+        if not audio_duration and not duration:
+            _, audio_duration = _scan_packets(path, "a:0")
+            if audio_duration:
+                result["duration_source"] = "packets"
+        duration = duration or audio_duration
+        result["audio"] = {
+            "codec": audio.get("codec_name"),
+            "sample_rate": int(audio["sample_rate"]) if str(audio.get("sample_rate", "")).isdigit() else None,
+            "channels": audio.get("channels"),
+            "duration_sec": round(audio_duration or duration, 3) if (audio_duration or duration) else None
+        }
+
+    if duration and not result["duration_source"]:
+        result["duration_source"] = "header"
+    result["duration_sec"] = round(duration, 3) if duration else None
+    return result
+
+
+def probe_media(path, use_cache=True):
+    """
+    Container metadata for a media file, or None if ffprobe is unavailable or
+    cannot read it:
+      {"format", "duration_sec", "duration_source": "header"|"packets",
+       "has_video", "has_audio",
+       "video": {"codec", "width", "height", "fps", "frame_count",
+                 "frame_count_source": "header"|"packets"|"estimate"} or None,
+       "audio": {"codec", "sample_rate", "channels", "duration_sec"} or None}
+    Any field may be None when the container does not carry it.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    identity = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if identity in _probe_memo:
+        return _probe_memo[identity]
+
+    cache = open_cache(use_cache)
+    key = cache_key(":".join(map(str, identity)), "media-probe", PROBE_VERSION, {}) if cache else None
+    result = cache.get(key) if key else None
+    if result is None:
+        result = _probe(path)
+        if result is not None and key:
+            try:
+                cache.put(key, result)
+            except OSError:
+                pass
+    _probe_memo[identity] = result
+    return result
+
+
+def video_frame_estimate(probe):
+    """Frame count from a probe result (exact or estimated), or 0 if unknown"""
+    video = (probe or {}).get("video") or {}
+    return video.get("frame_count") or 0
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "No media path provided"}))
+        sys.exit(1)
+    result = probe_media(sys.argv[1], use_cache=False)
+    if result is None:
+        print(json.dumps({"error": f"Cannot probe {sys.argv[1]} (is ffprobe installed?)"}))
+        sys.exit(1)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Load-aware Whisper model size selection, shared by whisper_transcribe.py
+(--model auto), After_video/whisper_pipeline.py and
+After_video/evaluate_interview.py (WHISPER_MODEL_SIZE=auto).
+Usage: python model_policy.py [<audio_sec> [<queued_audio_sec>]]
+Output: JSON to stdout with the chosen size and the measured RTF table.
+
+Each job gets the most accurate model whose estimated latency fits the SLO:
+  (audio queued ahead of it + its own audio) * RTF(model) / workers <= slo
+where RTF (real-time factor, transcription time / audio duration) is
+measured on this host: every transcription records its time, smoothed per
+model label (backend, size, compute type, ...) and kept in a small JSON
+file. Until a model has been measured, a conservative CPU prior is used.
+Under interview-day peaks the queue grows and jobs step down to smaller
+models instead of piling up behind a large one; if even the smallest
+model misses the SLO, it is used anyway.
+
+Environment:
+  WHISPER_SLO_SEC      target latency per job in seconds (default: 60)
+  WHISPER_MODEL_SIZES  sizes the policy may pick, smallest first (default: tiny,base,small)
+  WHISPER_RTF_FILE     measured RTF table (default: backend/.cache/whisper_rtf.json)
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+
+from media_probe import probe_media
+from transcribe_backends import DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE, model_label
+
+AUTO_MODEL = "auto"  # model size value that asks the policy
+MODEL_SIZES = ("tiny", "base", "small", "medium", "large")  # least to most accurate
+DEFAULT_POLICY_SIZES = ("tiny", "base", "small")
+DEFAULT_SLO_SEC = 60.0
+DEFAULT_AUDIO_SEC = 60.0  # assumed when a file's duration is unknown
+RTF_SMOOTHING = 0.3  # weight of the newest measurement
+# Rough CPU real-time factors, used until a model has been measured here
+PRIOR_RTF = {"tiny": 0.1, "base": 0.2, "small": 0.6, "medium": 1.5, "large": 3.0}
+DEFAULT_RTF_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "whisper_rtf.json")
+
+
+class RtfTable:
+    """Measured real-time factor per model label, persisted as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rtf = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.rtf = {k: float(v["rtf"]) for k, v in json.load(f).items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def get(self, label, model_size):
+        """Measured RTF for label, else the prior for its model size"""
+        with self.lock:
+            if label in self.rtf:
+                return self.rtf[label]
+        return PRIOR_RTF.get(model_size, PRIOR_RTF["large"])
+
+    def record(self, label, audio_sec, elapsed_sec):
+        """Fold one transcription's timing into the table; failures to save are ignored"""
+        if not audio_sec or audio_sec <= 0:
+            return
+        rtf = elapsed_sec / audio_sec
+        with self.lock:
+            old = self.rtf.get(label)
+            self.rtf[label] = rtf if old is None else old + RTF_SMOOTHING * (rtf - old)
+            snapshot = {k: {"rtf": round(v, 4)} for k, v in self.rtf.items()}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[model_policy] cannot save RTF table: {e}", file=sys.stderr)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def rtf_table():
+    """Process-wide RtfTable for WHISPER_RTF_FILE"""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = RtfTable(os.path.abspath(os.getenv("WHISPER_RTF_FILE") or DEFAULT_RTF_FILE))
+        return _table
+
+
+def rtf_key(model_size, backend=DEFAULT_BACKEND, compute_type=DEFAULT_COMPUTE_TYPE, beam_size=None,
+            chunked=False, vad=False):
+    """RTF table key of a model with these transcription options"""
+    return (model_label(backend, model_size, compute_type, beam_size)
+            + ("-chunked" if chunked else "") + ("-vad" if vad else ""))
+
+
+def policy_sizes():
+    """Sizes the policy may pick (WHISPER_MODEL_SIZES), smallest first"""
+    sizes = [s.strip() for s in os.getenv("WHISPER_MODEL_SIZES", ",".join(DEFAULT_POLICY_SIZES)).split(",")]
+    return sorted((s for s in sizes if s in MODEL_SIZES), key=MODEL_SIZES.index) or list(DEFAULT_POLICY_SIZES)
+
+
+def audio_seconds(path):
+    """Audio duration of a file from its container, or None if unknown"""
+    if not path:
+        return None
+    probe = probe_media(path) or {}
+    return (probe.get("audio") or {}).get("duration_sec") or probe.get("duration_sec")
+
+
+def choose_model_size(audio_sec, queued_audio_sec=0.0, slo_sec=None, label=None, workers=1, sizes=None):
+    """
+    (model size, decision) for one job. label(size) gives the RTF table key
+    of a size (default: rtf_key(size), the torch backend); decision holds
+    the estimate:
+      {"model", "audio_sec", "queued_audio_sec", "slo_sec", "rtf", "estimated_sec", "meets_slo"}
+    """
+    slo_sec = slo_sec or float(os.getenv("WHISPER_SLO_SEC", DEFAULT_SLO_SEC))
+    audio_sec = audio_sec or DEFAULT_AUDIO_SEC
+    label = label or rtf_key
+    table = rtf_table()
+    work = (queued_audio_sec + audio_sec) / max(1, workers)
+
+    choice = None
+    for size in sizes or policy_sizes():
+        rtf = table.get(label(size), size)
+        estimate = work * rtf
+        if choice is None or estimate <= slo_sec:
+            choice = (size, rtf, estimate)
+    size, rtf, estimate = choice
+    return size, {
+        "model": size,
+        "audio_sec": round(audio_sec, 2),
+        "queued_audio_sec": round(queued_audio_sec, 2),
+        "slo_sec": slo_sec,
+        "rtf": round(rtf, 4),
+        "estimated_sec": round(estimate, 1),
+        "meets_slo": estimate <= slo_sec
+    }
+
+
+def main():
+    audio_sec = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_AUDIO_SEC
+    queued = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    _, decision = choose_model_size(audio_sec, queued)
+    print(json.dumps({**decision, "measured_rtf": rtf_table().rtf}))
+
+
+if __name__ == "__main__":
+    main()
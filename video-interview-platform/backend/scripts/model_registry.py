@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of loaded Whisper models, shared by
+whisper_transcribe.py, After_video/whisper_pipeline.py and
+After_video/evaluate_interview.py, so a process loads each model once
+instead of per video.
+
+Models are loaded lazily on first get() and keyed by everything that makes
+two instances different: model size, backend, device, threads, beam size,
+compute type and chunking (see transcribe_backends.py and
+chunked_transcription.py), plus an optional slot for callers that need
+separate instances of the same model on different threads (one Whisper
+instance cannot decode two files at once). Loads are thread-safe: concurrent
+requests for one key wait for a single load, while different keys load in
+parallel. Once more than max_models are resident, the least recently used
+is evicted (ChunkedTranscriber pools are shut down) so configuring several
+sizes does not keep all of them in memory.
+
+Environment:
+  WHISPER_MAX_MODELS   models kept loaded per process (default: 2, 0 = no cap)
+  WHISPER_WARM_MODELS  comma-separated sizes warm() loads at startup
+"""
+
+import os
+import gc
+import sys
+import threading
+from collections import OrderedDict
+
+from transcribe_backends import DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE, load_transcriber
+
+DEFAULT_MAX_MODELS = 2
+
+
+class ModelRegistry:
+    """Thread-safe LRU cache of loaded transcribers"""
+
+    def __init__(self, max_models=DEFAULT_MAX_MODELS):
+        self.max_models = max_models
+        self.models = OrderedDict()  # key -> transcriber, least recently used first
+        self.loading = {}  # key -> Event set once the load finished (or failed)
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, model_size, backend=DEFAULT_BACKEND, device=None, threads=0, beam_size=None,
+            compute_type=DEFAULT_COMPUTE_TYPE, chunk_sec=0, chunk_jobs=0, slot=None, on_load=None):
+        """
+        The loaded transcriber for these settings, loading it if needed;
+        on_load() is called just before an actual load (e.g. to log it).
+        """
+        key = (model_size, backend, device, threads, beam_size, compute_type, chunk_sec, chunk_jobs, slot)
+        while True:
+            with self.lock:
+                if key in self.models:
+                    self.models.move_to_end(key)
+                    return self.models[key]
+                pending = self.loading.get(key)
+                if pending is None:
+                    pending = self.loading[key] = threading.Event()
+                    break
+            pending.wait()  # another thread is loading it; then look again
+
+        try:
+            if on_load:
+                on_load()
+            if chunk_sec:
+                from chunked_transcription import ChunkedTranscriber
+                model = ChunkedTranscriber(backend, model_size, threads=threads, beam_size=beam_size,
+                                           compute_type=compute_type, jobs=chunk_jobs, chunk_sec=chunk_sec,
+                                           device=device)
+            else:
+                model = load_transcriber(backend, model_size, threads=threads, beam_size=beam_size,
+                                         compute_type=compute_type, device=device)
+            with self.lock:
+                self.models[key] = model
+                self.loads += 1
+                evicted = self._evict()
+        finally:
+            with self.lock:
+                del self.loading[key]
+            pending.set()
+        for old in evicted:
+            _release(old)
+        return model
+
+    def warm(self, model_sizes, **settings):
+        """Load the given sizes now (e.g. at startup) instead of on first use"""
+        for model_size in model_sizes:
+            self.get(model_size, **settings)
+
+    def reserve(self, count):
+        """Raise the cap to at least count models (e.g. one set per server worker)"""
+        with self.lock:
+            if self.max_models and self.max_models < count:
+                self.max_models = count
+
+    def _evict(self):
+        """Drop least recently used models over the cap; caller holds the lock"""
+        evicted = []
+        while self.max_models and len(self.models) > self.max_models:
+            key, model = self.models.popitem(last=False)
+            print(f"[model_registry] evicting {key[0]} ({key[1]})", file=sys.stderr)
+            evicted.append(model)
+            self.evictions += 1
+        return evicted
+
+    def stats(self):
+        with self.lock:
+            return {"loaded": [key[0] for key in self.models], "loads": self.loads,
+                    "evictions": self.evictions, "max_models": self.max_models}
+
+
+def _release(model):
+    close = getattr(model, "close", None)
+    if close:
+        close()
+    del model
+    gc.collect()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def model_registry():
+    """The process-wide registry (cap from WHISPER_MAX_MODELS)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(int(os.getenv("WHISPER_MAX_MODELS", DEFAULT_MAX_MODELS)))
+        return _registry
+
+
+def warm_sizes():
+    """Model sizes listed in WHISPER_WARM_MODELS"""
+    return [s.strip() for s in os.getenv("WHISPER_WARM_MODELS", "").split(",") if s.strip()]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime backend for the DeepFace emotion classifier.
+Usage: python onnx_emotion.py export --output models/emotion.onnx [--int8]
+
+`export` converts DeepFace's Keras emotion CNN to ONNX (tf2onnx) and can
+quantize the weights to int8 (onnxruntime.quantization). OnnxEmotion then
+runs that model on CPU through ONNX Runtime, with no TensorFlow import, and
+exposes the subset of the DeepFace API that deepface_analyze.py uses:
+analyze() (single image or list of images, batched through one session
+run) and extract_faces(). Output uses the same seven emotion keys.
+
+Face detection uses OpenCV: the Haar cascade behind DeepFace's default
+"opencv" detector, or a YuNet ONNX face detector when detector_path is given
+(cv2.FaceDetectorYN, OpenCV >= 4.5.4).
+"""
+
+import os
+import sys
+import json
+import argparse
+
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+INPUT_SIZE = 48  # DeepFace emotion model input: 48x48 grayscale
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "emotion_int8.onnx")
+HAAR_SCALE_FACTOR = 1.1  # same detectMultiScale settings as DeepFace's opencv detector
+HAAR_MIN_NEIGHBORS = 10
+
+
+class OnnxEmotion:
+    """DeepFace-compatible analyze()/extract_faces() backed by ONNX Runtime"""
+
+    def __init__(self, model_path=None, detector_path=None, threads=0):
+        import cv2
+        import numpy as np
+        import onnxruntime as ort
+
+        self.cv2 = cv2
+        self.np = np
+        self.model_path = model_path or os.getenv("EMOTION_ONNX_MODEL") or DEFAULT_MODEL_PATH
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"ONNX emotion model not found: {self.model_path}. "
+                "Run: python onnx_emotion.py export --output <path> --int8"
+            )
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(self.model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        self.yunet = None
+        self.cascade = None
+        if detector_path:
+            self.yunet = cv2.FaceDetectorYN.create(detector_path, "", (320, 320))
+        else:
+            self.cascade = cv2.CascadeClassifier(
+                os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+            )
+
+    def _detect(self, img):
+        """Face boxes (x, y, w, h, confidence) in the image, best first"""
+        h, w = img.shape[:2]
+        if self.yunet is not None:
+            self.yunet.setInputSize((w, h))
+            _, faces = self.yunet.detect(img)
+            boxes = [] if faces is None else [
+                (int(f[0]), int(f[1]), int(f[2]), int(f[3]), float(f[-1])) for f in faces
+            ]
+        else:
+            gray = self.cv2.cvtColor(img, self.cv2.COLOR_BGR2GRAY)
+            found = self.cascade.detectMultiScale(gray, HAAR_SCALE_FACTOR, HAAR_MIN_NEIGHBORS)
+            boxes = [(int(x), int(y), int(bw), int(bh), 1.0) for x, y, bw, bh in found]
+        boxes = [(max(0, x), max(0, y), bw, bh, c) for x, y, bw, bh, c in boxes if bw > 0 and bh > 0]
+        return sorted(boxes, key=lambda b: (b[4], b[2] * b[3]), reverse=True)
+
+    def _faces(self, img, detector_backend, enforce_detection):
+        """(crop, region, confidence) for the faces in img; whole image if none found"""
+        h, w = img.shape[:2]
+        if detector_backend != "skip":
+            boxes = self._detect(img)
+            if boxes:
+                return [(img[y:y + bh, x:x + bw], {"x": x, "y": y, "w": bw, "h": bh}, c)
+                        for x, y, bw, bh, c in boxes]
+            if enforce_detection:
+                raise ValueError("Face could not be detected")
+        return [(img, {"x": 0, "y": 0, "w": w, "h": h}, 0.0 if detector_backend != "skip" else 1.0)]
+
+    def _preprocess(self, crop):
+        gray = self.cv2.cvtColor(crop, self.cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        gray = self.cv2.resize(gray, (INPUT_SIZE, INPUT_SIZE))
+        return gray.astype(self.np.float32)[:, :, None] / 255.0
+
+    def predict(self, crops):
+        """Emotion probabilities (0-100) for a list of face crops, one session run"""
+        batch = self.np.stack([self._preprocess(c) for c in crops])
+        probs = self.session.run(None, {self.input_name: batch})[0]
+        return probs * 100.0
+
+    def extract_faces(self, img_path, detector_backend="opencv", enforce_detection=True, **kwargs):
+        return [
+            {"face": crop, "facial_area": region, "confidence": confidence}
+            for crop, region, confidence in self._faces(img_path, detector_backend, enforce_detection)
+        ]
+
+    def analyze(self, img_path, actions=("emotion",), enforce_detection=True,
+                detector_backend="opencv", silent=False, **kwargs):
+        """Same result shape as DeepFace.analyze(actions=["emotion"]); a list input returns a list per image"""
+        images = img_path if isinstance(img_path, list) else [img_path]
+        per_image = [self._faces(img, detector_backend, enforce_detection) for img in images]
+        crops = [crop for faces in per_image for crop, _, _ in faces]
+        scores = self.predict(crops) if crops else []
+
+        results, k = [], 0
+        for faces in per_image:
+            image_results = []
+            for _, region, confidence in faces:
+                emotion = {label: float(v) for label, v in zip(EMOTION_LABELS, scores[k])}
+                image_results.append({
+                    "emotion": emotion,
+                    "dominant_emotion": max(emotion, key=emotion.get),
+                    "region": region,
+                    "face_confidence": confidence
+                })
+                k += 1
+            results.append(image_results)
+        return results if isinstance(img_path, list) else results[0]
+
+
+def export_model(output_path, int8=False):
+    """Convert DeepFace's Keras emotion model to ONNX, optionally int8-quantized"""
+    import tensorflow as tf
+    import tf2onnx
+
+    try:
+        from deepface.modules.modeling import build_model
+        model = build_model(task="facial_attribute", model_name="Emotion")
+    except (ImportError, TypeError):
+        from deepface import DeepFace
+        model = DeepFace.build_model("Emotion")
+    keras_model = getattr(model, "model", model)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    float_path = output_path if not int8 else output_path + ".fp32.onnx"
+    spec = (tf.TensorSpec((None, INPUT_SIZE, INPUT_SIZE, 1), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, output_path=float_path)
+
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+        os.remove(float_path)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX emotion model tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export DeepFace's emotion model to ONNX")
+    export.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    export.add_argument("--int8", action="store_true", help="Quantize weights to int8")
+    args = parser.parse_args()
+
+    try:
+        path = export_model(args.output, int8=args.int8)
+        print(json.dumps({"model": path, "int8": args.int8}))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ const path = require('path');
 const { Pool } = require('pg');
 const config = require('../config');
 const { runPipeline } = require('../services/videoEvaluationPipeline');
+const { stopWorker } = require('../services/emotionAnalysis');
+const { stopWorker: stopWhisperWorker } = require('../services/transcription');
 
 const pool = new Pool({ connectionString: process.env.DATABASE_URL });
 
@@ -34,6 +36,8 @@ async function processPendingVideos() {
     }
     
     await pool.end();
+    stopWorker();
+    stopWhisperWorker();
     console.log('\nAll done!');
 }
 
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for analysis results.
+Shared by deepface_analyze.py and whisper_transcribe.py so that re-runs on
+unchanged videos (reset-failed.js / process-pending.js) return the stored
+JSON instead of decoding and analyzing again.
+
+Keys combine a BLAKE2 hash of the file bytes with the model name, the model
+package version and the analysis parameters. Entries are JSON files written
+atomically (temp file + os.replace); reads refresh the file's mtime and the
+least recently used entries are evicted once the cache exceeds its size cap.
+
+Environment:
+  ANALYSIS_CACHE_DIR     cache directory (default: backend/.cache/analysis)
+  ANALYSIS_CACHE_MAX_MB  size cap in MB (default: 512)
+  ANALYSIS_CACHE=off     disable the cache
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "analysis")
+DEFAULT_MAX_MB = 512
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# (path, size, mtime_ns) -> digest, so one process hashes each file once
+_hash_memo = {}
+
+
+def content_hash(path):
+    """BLAKE2b digest of the file contents"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+
+    h = hashlib.blake2b(digest_size=20)
+    h.update(str(stat.st_size).encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _hash_memo[memo_key] = digest
+    return digest
+
+
+def package_version(name):
+    """Installed version of a package, without importing it"""
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return "unknown"
+
+
+def cache_key(file_hash, model, version, params):
+    """Stable key for (file contents, model, model version, parameters)"""
+    payload = json.dumps(
+        {"file": file_hash, "model": model, "version": version, "params": params},
+        sort_keys=True, default=str
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of JSON results in a directory"""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = os.path.abspath(directory or os.getenv("ANALYSIS_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("ANALYSIS_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """Stored result for key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Corrupt or unreadable entry: drop it and treat as a miss
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """Store result atomically, then evict old entries if over the size cap"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f, default=lambda x: float(x) if hasattr(x, 'item') else str(x))
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+def open_cache(enabled=True):
+    """ResultCache unless disabled by the caller or ANALYSIS_CACHE=off"""
+    if not enabled or os.getenv("ANALYSIS_CACHE", "").lower() in ("off", "0", "false"):
+        return None
+    return ResultCache()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Voice-activity trimming in front of Whisper, shared by whisper_transcribe.py
+and After_video/whisper_pipeline.py.
+Usage: python speech_activity.py <path>
+Output: JSON to stdout with the detected speech regions, see vad_summary().
+
+Candidates often sit silent before and after an answer and pause between
+thoughts, and Whisper decodes every 30s window of that silence anyway. The
+audio is decoded once with ffmpeg (16 kHz mono, what Whisper itself uses),
+speech regions are found with a short-time energy detector whose threshold
+adapts to the recording's own noise floor, and only those regions (with a
+little padding) are concatenated and handed to the model as an array.
+Segment timestamps are then mapped back onto the original timeline.
+
+Pauses shorter than min_silence_sec are kept, so the model still sees
+natural sentence breaks; only longer silences are cut.
+
+Environment:
+  FFMPEG_BIN  ffmpeg executable (default: ffmpeg on PATH)
+"""
+
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper's input rate
+FRAME_SEC = 0.03
+NOISE_PERCENTILE = 10  # frames this quiet are taken as the noise floor
+THRESHOLD_DB = 12.0  # speech is this far above the noise floor...
+MIN_SPEECH_DBFS = -50.0  # ...and never quieter than this
+DEFAULT_MIN_SPEECH_SEC = 0.25
+DEFAULT_MIN_SILENCE_SEC = 1.0
+DEFAULT_PAD_SEC = 0.3
+
+
+def load_audio(path, sample_rate=SAMPLE_RATE):
+    """Decode a file's audio to mono float32 in [-1, 1] with ffmpeg"""
+    ffmpeg = shutil.which(os.getenv("FFMPEG_BIN", "ffmpeg"))
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found (set FFMPEG_BIN or install ffmpeg)")
+    cmd = [ffmpeg, "-nostdin", "-threads", "0", "-i", path, "-f", "s16le", "-ac", "1",
+           "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"]
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Failed to load audio: {proc.stderr.decode(errors='ignore')[-500:]}")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def frame_levels(audio, sample_rate=SAMPLE_RATE):
+    """Level in dBFS of each FRAME_SEC frame"""
+    frame = int(sample_rate * FRAME_SEC)
+    n_frames = len(audio) // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect_speech(audio, sample_rate=SAMPLE_RATE, min_speech_sec=DEFAULT_MIN_SPEECH_SEC,
+                  min_silence_sec=DEFAULT_MIN_SILENCE_SEC, pad_sec=DEFAULT_PAD_SEC):
+    """Speech regions as a sorted list of non-overlapping (start_sec, end_sec)"""
+    db = frame_levels(audio, sample_rate)
+    if len(db) == 0:
+        return []
+    threshold = max(np.percentile(db, NOISE_PERCENTILE) + THRESHOLD_DB, MIN_SPEECH_DBFS)
+    active = db > threshold
+
+    # Runs of active frames -> regions
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    regions = [[float(s) * FRAME_SEC, float(e) * FRAME_SEC] for s, e in zip(edges[::2], edges[1::2])]
+
+    # Close short pauses, then drop blips
+    merged = []
+    for start, end in regions:
+        if merged and start - merged[-1][1] < min_silence_sec:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    merged = [r for r in merged if r[1] - r[0] >= min_speech_sec]
+
+    duration = len(audio) / sample_rate
+    padded = []
+    for start, end in merged:
+        start, end = max(0.0, start - pad_sec), min(duration, end + pad_sec)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+
+def trim_audio(audio, regions, sample_rate=SAMPLE_RATE):
+    """
+    (speech-only audio, spans) where spans maps the trimmed timeline back:
+    [(trimmed_start_sec, original_start_sec, length_sec), ...]
+    """
+    pieces, spans, position = [], [], 0.0
+    for start, end in regions:
+        piece = audio[int(start * sample_rate):int(end * sample_rate)]
+        pieces.append(piece)
+        spans.append((position, start, len(piece) / sample_rate))
+        position += len(piece) / sample_rate
+    trimmed = np.concatenate(pieces) if pieces else np.zeros(0, np.float32)
+    return trimmed, spans
+
+
+def to_original_time(t, spans):
+    """Map a time on the trimmed audio back to the original recording"""
+    for trimmed_start, original_start, length in reversed(spans):
+        if t >= trimmed_start:
+            return round(original_start + min(t - trimmed_start, length), 3)
+    return round(t, 3)
+
+
+def remap_segments(segments, spans):
+    """Copy of Whisper segments with start/end on the original timeline"""
+    mapped = []
+    for segment in segments:
+        segment = dict(segment)
+        segment["start"] = to_original_time(segment["start"], spans)
+        segment["end"] = to_original_time(segment["end"], spans)
+        mapped.append(segment)
+    return mapped
+
+
+def vad_summary(audio, regions, sample_rate=SAMPLE_RATE):
+    """{"audio_sec", "speech_sec", "skipped_sec", "skipped_percent", "regions"}"""
+    audio_sec = len(audio) / sample_rate
+    speech_sec = sum(end - start for start, end in regions)
+    return {
+        "audio_sec": round(audio_sec, 2),
+        "speech_sec": round(speech_sec, 2),
+        "skipped_sec": round(audio_sec - speech_sec, 2),
+        "skipped_percent": round(100 * (audio_sec - speech_sec) / audio_sec, 1) if audio_sec else 0.0,
+        "regions": [[round(start, 2), round(end, 2)] for start, end in regions]
+    }
+
+
+def transcribe_speech(transcriber, audio, **vad_options):
+    """
+    Transcribe only the speech in a file (path) or already decoded audio with
+    a loaded transcriber (see transcribe_backends.py). Returns its {"text",
+    "language", "segments"}, segments on the original timeline, plus a "vad"
+    summary.
+    """
+    if isinstance(audio, str):
+        audio = load_audio(audio)
+    regions = detect_speech(audio, **vad_options)
+    summary = vad_summary(audio, regions)
+    if not regions:
+        return {"text": "", "language": "en", "segments": [], "vad": summary}
+    trimmed, spans = trim_audio(audio, regions)
+    result = transcriber.transcribe(trimmed)
+    result["segments"] = remap_segments(result.get("segments", []), spans)
+    result["vad"] = summary
+    return result
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "No media path provided"}))
+        sys.exit(1)
+    try:
+        audio = load_audio(sys.argv[1])
+    except RuntimeError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    print(json.dumps(vad_summary(audio, detect_speech(audio))))
+
+
+if __name__ == "__main__":
+    main()
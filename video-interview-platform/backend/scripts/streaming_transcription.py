@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Incremental transcription of recordings that are still being uploaded, used
+by After_video/whisper_pipeline.py (VideoHandler, WHISPER_STREAMING=on).
+Usage: python streaming_transcription.py <growing_file> [--model base] [--window-sec 30]
+                                         [--idle-sec 3] [--backend torch|ctranslate2]
+       <pcm feed> | python streaming_transcription.py - [...]
+Output: JSON lines to stdout: {"type": "partial", "segments": [...]} as
+windows are committed, then {"type": "final", "result": {"text", "language",
+"segments", "streaming"}} (or {"error": ...}).
+
+The upload is transcribed window by window while it grows instead of after
+it is complete. The file is re-decoded whenever its size changes (audio
+decoding costs a small fraction of transcription); audio older than
+TAIL_GUARD_SEC is final, and each time window_sec of final audio is pending
+it is transcribed with the tail of the committed text as Whisper's prompt
+(the rolling context). All segments but the last are committed; the last one
+may be cut by the window edge, so the next window starts at its beginning.
+Once the file stops growing for idle_sec, only the remaining tail - at most
+one window - is left to transcribe.
+
+With "-", raw 16 kHz mono s16le PCM is read from stdin as a chunk feed
+(e.g. ffmpeg ... -f s16le -ac 1 -ar 16000 -) and finished at EOF.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from speech_activity import SAMPLE_RATE, load_audio
+from transcribe_backends import TRANSCRIBE_BACKENDS, DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE, load_transcriber
+
+DEFAULT_WINDOW_SEC = 30.0  # Whisper's own input window
+TAIL_GUARD_SEC = 1.0  # the newest audio may still change as the upload continues
+PROMPT_CHARS = 200  # committed text passed on as context
+MIN_ADVANCE_SEC = 1.0  # a window always commits at least this much
+MIN_TAIL_SEC = 0.5  # shorter leftovers are not worth a Whisper call
+DEFAULT_POLL_SEC = 1.0
+DEFAULT_IDLE_SEC = 3.0  # no growth for this long ends the recording
+PCM_CHUNK_BYTES = SAMPLE_RATE * 2 * 5  # five seconds of s16le
+
+
+class StreamingTranscriber:
+    """
+    Rolling-window transcription of audio that arrives over time. update()
+    replaces the audio received so far, push() appends to it, finish()
+    transcribes the rest; on_commit(segments) is called with each batch of
+    committed segments (on the recording's timeline).
+    """
+
+    def __init__(self, transcriber, window_sec=DEFAULT_WINDOW_SEC, on_commit=None):
+        self.transcriber = transcriber
+        self.window = int(window_sec * SAMPLE_RATE)
+        self.on_commit = on_commit
+        self.audio = np.zeros(0, np.float32)
+        self.committed = 0  # samples covered by committed segments
+        self.segments = []
+        self.languages = []
+        self.windows = 0
+
+    def update(self, audio):
+        """Audio received so far (a re-decode of the growing file)"""
+        if len(audio) >= len(self.audio):
+            self.audio = audio
+        final = len(self.audio) - int(TAIL_GUARD_SEC * SAMPLE_RATE)
+        while final - self.committed >= self.window:
+            self._transcribe_window(self.committed + self.window, last=False)
+
+    def push(self, samples):
+        """Append newly received samples (chunk feed)"""
+        self.update(np.concatenate((self.audio, samples)))
+
+    def finish(self):
+        """Transcribe everything not yet committed and return the full result"""
+        while len(self.audio) - self.committed > self.window:
+            self._transcribe_window(self.committed + self.window, last=False)
+        if len(self.audio) - self.committed >= int(MIN_TAIL_SEC * SAMPLE_RATE):
+            self._transcribe_window(len(self.audio), last=True)
+        return self.result()
+
+    def result(self):
+        return {
+            "text": "".join(s["text"] for s in self.segments).strip(),
+            "language": max(set(self.languages), key=self.languages.count) if self.languages else "en",
+            "segments": self.segments,
+            "streaming": {"windows": self.windows, "audio_sec": round(len(self.audio) / SAMPLE_RATE, 2)}
+        }
+
+    def _transcribe_window(self, end, last):
+        offset = self.committed / SAMPLE_RATE
+        prompt = "".join(s["text"] for s in self.segments)[-PROMPT_CHARS:].strip()
+        options = {"initial_prompt": prompt} if prompt else {}
+        result = self.transcriber.transcribe(self.audio[self.committed:end], **options)
+        self.windows += 1
+        if result.get("language"):
+            self.languages.append(result["language"])
+
+        segments = result.get("segments", [])
+        advance = (end - self.committed) / SAMPLE_RATE
+        if not last and len(segments) > 1 and segments[-1]["start"] >= MIN_ADVANCE_SEC:
+            # Hold back the last segment: the window edge may have cut it
+            advance = segments[-1]["start"]
+            segments = segments[:-1]
+
+        committed = []
+        for segment in segments:
+            segment = dict(segment)
+            segment["start"] = round(segment["start"] + offset, 3)
+            segment["end"] = round(min(segment["end"], advance) + offset, 3)
+            segment["id"] = len(self.segments)
+            self.segments.append(segment)
+            committed.append(segment)
+        self.committed += int(advance * SAMPLE_RATE)
+        if committed and self.on_commit:
+            self.on_commit(committed)
+
+
+def follow_file(path, transcriber, window_sec=DEFAULT_WINDOW_SEC, poll_sec=DEFAULT_POLL_SEC,
+                idle_sec=DEFAULT_IDLE_SEC, on_commit=None):
+    """
+    Transcribe a file while it grows; returns the result once it has not
+    grown for idle_sec (with "tail_sec", the time spent after that), or None
+    if the file disappears.
+    """
+    stream = StreamingTranscriber(transcriber, window_sec, on_commit)
+    last_size, last_change = -1, time.monotonic()
+    while True:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if size != last_size:
+            last_size, last_change = size, time.monotonic()
+            try:
+                stream.update(load_audio(path))
+            except RuntimeError:
+                pass  # container header not complete yet
+        elif time.monotonic() - last_change >= idle_sec:
+            break
+        time.sleep(poll_sec)
+
+    tail_started = time.monotonic()
+    stream.update(load_audio(path))
+    output = stream.finish()
+    output["streaming"]["tail_sec"] = round(time.monotonic() - tail_started, 2)
+    return output
+
+
+def follow_pcm(stream_in, transcriber, window_sec=DEFAULT_WINDOW_SEC, on_commit=None):
+    """Transcribe a raw 16 kHz mono s16le feed until EOF"""
+    stream = StreamingTranscriber(transcriber, window_sec, on_commit)
+    pending = b""
+    while True:
+        chunk = stream_in.read(PCM_CHUNK_BYTES)
+        if not chunk:
+            break
+        pending += chunk
+        usable = len(pending) - len(pending) % 2
+        stream.push(np.frombuffer(pending[:usable], np.int16).astype(np.float32) / 32768.0)
+        pending = pending[usable:]
+    tail_started = time.monotonic()
+    output = stream.finish()
+    output["streaming"]["tail_sec"] = round(time.monotonic() - tail_started, 2)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental Whisper transcription")
+    parser.add_argument("path", help="Growing media file, or - for a PCM feed on stdin")
+    parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--backend", choices=TRANSCRIBE_BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--compute-type", default=DEFAULT_COMPUTE_TYPE)
+    parser.add_argument("--window-sec", type=float, default=DEFAULT_WINDOW_SEC)
+    parser.add_argument("--idle-sec", type=float, default=DEFAULT_IDLE_SEC,
+                        help="Seconds without growth after which the file is complete")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    sys.stdout = sys.stderr  # keep stray library prints off the output
+
+    def emit(message):
+        out.write(json.dumps(message) + "\n")
+        out.flush()
+
+    try:
+        transcriber = load_transcriber(args.backend, args.model, compute_type=args.compute_type)
+        on_commit = lambda segments: emit({"type": "partial", "segments": segments})
+        if args.path == "-":
+            result = follow_pcm(sys.stdin.buffer, transcriber, args.window_sec, on_commit)
+        else:
+            result = follow_file(args.path, transcriber, args.window_sec, idle_sec=args.idle_sec,
+                                 on_commit=on_commit)
+            if result is None:
+                raise FileNotFoundError(f"{args.path} disappeared")
+        emit({"type": "final", "result": result})
+    except Exception as e:
+        emit({"error": str(e)})
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
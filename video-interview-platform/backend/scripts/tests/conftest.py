@@ -0,0 +1,70 @@
+"""
+Shared fixtures for the backend script tests: the scripts directory on
+sys.path, a deterministic stand-in for DeepFace and small generated videos.
+Run with: python -m pytest video-interview-platform/backend/scripts/tests
+"""
+
+import os
+import sys
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+
+class FakeDeepFace:
+    """Scores derived from the mean pixel value, so equal frames score equally"""
+
+    @staticmethod
+    def analyze(img, **kwargs):
+        def one(image):
+            level = float(image.mean())
+            emotion = {e: (level * (i + 1)) % 100 for i, e in enumerate(EMOTIONS)}
+            return [{"emotion": emotion, "dominant_emotion": max(emotion, key=emotion.get),
+                     "region": {}}]
+        return [one(i) for i in img] if isinstance(img, list) else one(img)
+
+    @staticmethod
+    def extract_faces(img, **kwargs):
+        h, w = img.shape[:2]
+        return [{"face": img, "facial_area": {"x": 0, "y": 0, "w": w, "h": h}, "confidence": 1}]
+
+
+# Registered before deepface_analyze is imported; shard and worker processes
+# are forked from here and inherit it
+sys.modules["deepface"] = types.SimpleNamespace(DeepFace=FakeDeepFace)
+
+
+def write_video(path, frame_at, frames=300, fps=30, size=64):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (size, size))
+    for i in range(frames):
+        writer.write(frame_at(i, size))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def fading_video(tmp_path_factory):
+    """10s at 30 fps whose brightness changes on every frame"""
+    return write_video(tmp_path_factory.mktemp("video") / "fading.avi",
+                       lambda i, size: np.full((size, size, 3), (i * 7) % 255, np.uint8))
+
+
+@pytest.fixture(scope="session")
+def still_video(tmp_path_factory):
+    """10s at 30 fps of five static 2s shots, for reuse and tracking"""
+    rng = np.random.default_rng(0)
+    shots = [cv2.resize(rng.integers(0, 255, (8, 8, 3), dtype=np.uint8), (64, 64))
+             for _ in range(5)]
+    return write_video(tmp_path_factory.mktemp("video") / "still.avi",
+                       lambda i, size: shots[i // 60])
+
+
+@pytest.fixture
+def deepface():
+    return FakeDeepFace
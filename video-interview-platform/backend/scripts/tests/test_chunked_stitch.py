@@ -0,0 +1,45 @@
+from chunked_transcription import OVERLAP_SEC, _drop_repeated_words, stitch
+from speech_activity import SAMPLE_RATE
+
+
+def segment(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def test_drop_repeated_words():
+    assert _drop_repeated_words(" I worked on", " on the backend.") == " the backend."
+    assert _drop_repeated_words(" at the start, we", " The start, we said") == " said"
+    assert _drop_repeated_words(" Hello there.", " General Kenobi.") == " General Kenobi."
+    assert _drop_repeated_words(" I worked on", " On") == ""
+
+
+def test_punctuation_alone_is_not_a_repeat():
+    assert _drop_repeated_words(" Well -", " - right.") == " - right."
+
+
+def test_stitch_removes_overlap_and_repeated_words():
+    points = [0, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE]
+    offset = 10 - OVERLAP_SEC  # the second chunk starts OVERLAP_SEC before its split point
+    results = [
+        {"language": "en", "segments": [segment(0.0, 5.0, " Hello there."),
+                                         segment(5.0, 10.0, " I worked on")]},
+        {"language": "en", "segments": [segment(0.0, 0.8, " worked on"),
+                                         segment(0.9, 3.0, " on the backend team."),
+                                         segment(3.0, 6.0, " It went well.")]},
+    ]
+    merged = stitch(results, points)
+
+    assert merged["text"] == "Hello there. I worked on the backend team. It went well."
+    assert merged["language"] == "en"
+    assert [s["id"] for s in merged["segments"]] == [0, 1, 2, 3]
+    assert [s["start"] for s in merged["segments"]] == [0.0, 5.0, round(0.9 + offset, 3),
+                                                         round(3.0 + offset, 3)]
+
+
+def test_stitch_keeps_text_without_repeats():
+    points = [0, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE]
+    results = [
+        {"language": "en", "segments": [segment(0.0, 10.0, " First answer.")]},
+        {"language": "en", "segments": [segment(1.5, 4.0, " Second part.")]},
+    ]
+    assert stitch(results, points)["text"] == "First answer. Second part."
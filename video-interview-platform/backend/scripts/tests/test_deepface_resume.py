@@ -0,0 +1,58 @@
+import cv2
+import pytest
+
+import deepface_analyze as da
+from checkpoint_store import Checkpointer
+from conftest import FakeDeepFace
+
+
+class Killed(BaseException):
+    """Simulates the process being killed (not caught like a model error)"""
+
+
+def killed_after(calls):
+    """A DeepFace stand-in that dies on its calls-th analyze call"""
+    count = {"n": 0}
+
+    class Dying(FakeDeepFace):
+        @staticmethod
+        def analyze(img, **kwargs):
+            count["n"] += 1
+            if count["n"] == calls:
+                raise Killed()
+            return FakeDeepFace.analyze(img, **kwargs)
+    return Dying
+
+
+RESUME_OPTIONS = [
+    {},
+    {"batch_size": 4},
+    {"track": True},
+    {"workers": 3, "track": True},
+    {"workers": 3, "batch_size": 2, "track": True},
+]
+# Every frame of fading_video hashes alike, so reuse only needs still_video
+REUSE_OPTIONS = [
+    {"reuse_threshold": 8},
+    {"workers": 2, "track": True, "reuse_threshold": 4},
+]
+
+
+@pytest.mark.parametrize("video,options",
+                         [(video, options) for video in ("fading_video", "still_video")
+                          for options in RESUME_OPTIONS]
+                         + [("still_video", options) for options in REUSE_OPTIONS])
+def test_resumed_run_matches_uninterrupted_run(request, tmp_path, deepface, video, options):
+    video_path = request.getfixturevalue(video)
+    expected = da.analyze_video(cv2, deepface, video_path, **options)
+
+    checkpoint = tmp_path / "job.ckpt"
+    with pytest.raises(Killed):
+        da.analyze_video(cv2, killed_after(3), video_path,
+                         checkpointer=Checkpointer(str(checkpoint), 0), **options)
+    assert checkpoint.exists()
+
+    resumed = da.analyze_video(cv2, deepface, video_path,
+                               checkpointer=Checkpointer(str(checkpoint), 0), **options)
+    assert resumed == expected
+    assert not checkpoint.exists()
@@ -0,0 +1,28 @@
+import cv2
+import pytest
+
+import deepface_analyze as da
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"batch_size": 4},
+    {"timeline_format": "columnar"},
+    {"timeline_format": "segments"},
+])
+def test_shards_match_sequential_run(deepface, fading_video, options):
+    sequential = da.analyze_video(cv2, deepface, fading_video, **options)
+    sharded = da.analyze_video(cv2, deepface, fading_video, shards=3, **options)
+    assert sharded.pop("sharding") == {"shards": 3}
+    assert sharded == sequential
+
+
+def test_shard_ranges_start_on_sample_boundaries():
+    ranges = da.shard_ranges(300, 5, 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 300
+    assert all(start % 5 == 0 for start, _ in ranges)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_more_shards_than_samples():
+    assert da.shard_ranges(10, 5, 8) == [(0, 5), (5, 10)]
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry
+
+
+class FakeTranscriber:
+    def __init__(self, backend, model_size, **settings):
+        self.model_size = model_size
+        self.settings = settings
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Every transcriber the registry loads, in load order"""
+    loaded = []
+
+    def load_transcriber(backend, model_size, **settings):
+        time.sleep(0.01)
+        loaded.append(FakeTranscriber(backend, model_size, **settings))
+        return loaded[-1]
+    monkeypatch.setattr(model_registry, "load_transcriber", load_transcriber)
+    return loaded
+
+
+def test_get_loads_each_model_once(loads):
+    registry = ModelRegistry(max_models=2)
+    assert registry.get("base") is registry.get("base")
+    assert registry.get("base", device="cuda") is not registry.get("base")
+    assert len(loads) == 2
+
+
+def test_concurrent_gets_share_one_load(loads):
+    registry = ModelRegistry(max_models=2)
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get("small")))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1
+    assert all(model is loads[0] for model in models)
+
+
+def test_least_recently_used_model_is_evicted_over_the_cap(loads):
+    registry = ModelRegistry(max_models=2)
+    tiny, base = registry.get("tiny"), registry.get("base")
+    registry.get("tiny")  # base is now the least recently used
+    registry.get("small")
+
+    assert base.closed and not tiny.closed
+    assert registry.stats() == {"loaded": ["tiny", "small"], "loads": 3, "evictions": 1,
+                                "max_models": 2}
+    registry.get("base")
+    assert len(loads) == 4
+
+
+def test_no_cap(loads):
+    registry = ModelRegistry(max_models=0)
+    registry.warm(["tiny", "base", "small"])
+    assert registry.stats()["loaded"] == ["tiny", "base", "small"]
+    assert registry.stats()["evictions"] == 0
+
+
+def test_reserve_only_raises_the_cap(loads):
+    registry = ModelRegistry(max_models=2)
+    registry.reserve(4)
+    registry.reserve(3)
+    assert registry.max_models == 4
+    registry.warm(["tiny", "base", "small", "medium"])
+    assert registry.stats()["evictions"] == 0
+
+    uncapped = ModelRegistry(max_models=0)
+    uncapped.reserve(4)
+    assert uncapped.max_models == 0
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Pluggable speech-to-text backends shared by whisper_transcribe.py and
+After_video/whisper_pipeline.py.
+
+  torch        openai-whisper (PyTorch), the original path
+  ctranslate2  faster-whisper: the same Whisper weights converted to
+               CTranslate2, with int8 (or int8_float32, float32, ...)
+               inference on CPU
+
+load_transcriber() returns an object whose transcribe(audio) gives
+{"text", "language", "segments"} for either backend, where audio is a file
+path or a 16 kHz mono float32 array (see speech_activity.py); segments carry
+openai-whisper's keys (id, seek, start, end, text, tokens, temperature,
+avg_logprob, compression_ratio, no_speech_prob).
+"""
+
+import os
+
+TRANSCRIBE_BACKENDS = ("torch", "ctranslate2")
+DEFAULT_BACKEND = "torch"
+DEFAULT_COMPUTE_TYPE = "int8"
+CT2_DEFAULT_BEAM_SIZE = 5  # faster-whisper's own default
+SEGMENT_FIELDS = ("id", "seek", "start", "end", "text", "tokens", "temperature",
+                  "avg_logprob", "compression_ratio", "no_speech_prob")
+INSTALL_HINTS = {
+    "torch": "Whisper not installed. Run: pip install openai-whisper",
+    "ctranslate2": "faster-whisper not installed. Run: pip install faster-whisper"
+}
+PACKAGES = {"torch": "openai-whisper", "ctranslate2": "faster-whisper"}
+
+
+def import_backend(backend):
+    """Import and return the backend's package; ImportError carries an install hint"""
+    if backend not in TRANSCRIBE_BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {backend}")
+    try:
+        if backend == "ctranslate2":
+            import faster_whisper
+            return faster_whisper
+        import whisper
+        return whisper
+    except ImportError as e:
+        raise ImportError(INSTALL_HINTS[backend]) from e
+
+
+def model_label(backend, model_size, compute_type=DEFAULT_COMPUTE_TYPE, beam_size=None):
+    """Name for cache keys and reports, e.g. "whisper-base" or "ct2-base-int8-beam5" """
+    if backend == "ctranslate2":
+        label = f"ct2-{model_size}-{compute_type}"
+    else:
+        label = f"whisper-{model_size}"
+    return label + (f"-beam{beam_size}" if beam_size else "")
+
+
+class TorchTranscriber:
+    """
+    openai-whisper model; beam_size None keeps Whisper's greedy default and
+    device None (or "auto") lets Whisper pick CUDA when available
+    """
+
+    def __init__(self, model_size, threads=0, beam_size=None, device=None):
+        whisper = import_backend("torch")
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_size, device=None if device == "auto" else device)
+        self.beam_size = beam_size
+
+    def transcribe(self, path, **options):
+        if self.beam_size:
+            options.setdefault("beam_size", self.beam_size)
+        result = self.model.transcribe(path, **options)
+        return {
+            "text": result["text"].strip(),
+            "language": result.get("language", "en"),
+            "segments": result.get("segments", [])
+        }
+
+
+class CT2Transcriber:
+    """faster-whisper (CTranslate2) model, on CPU unless device says otherwise"""
+
+    def __init__(self, model_size, threads=0, beam_size=None, compute_type=DEFAULT_COMPUTE_TYPE, device=None):
+        faster_whisper = import_backend("ctranslate2")
+        self.model = faster_whisper.WhisperModel(model_size, device=device or "cpu", compute_type=compute_type,
+                                                 cpu_threads=threads or 0)
+        self.beam_size = beam_size or CT2_DEFAULT_BEAM_SIZE
+
+    def transcribe(self, path, **options):
+        options.setdefault("beam_size", self.beam_size)
+        segments, info = self.model.transcribe(path, **options)
+        segments = [{field: getattr(s, field, None) for field in SEGMENT_FIELDS} for s in segments]
+        return {
+            "text": "".join(s["text"] for s in segments).strip(),
+            "language": info.language or "en",
+            "segments": segments
+        }
+
+
+def load_transcriber(backend=DEFAULT_BACKEND, model_size="base", threads=0, beam_size=None,
+                     compute_type=DEFAULT_COMPUTE_TYPE, device=None):
+    """
+    Load a model for the chosen backend (device None: the backend's default,
+    auto for torch and cpu for ctranslate2); most callers should go through
+    model_registry.py so each process loads a model once
+    """
+    if backend == "ctranslate2":
+        return CT2Transcriber(model_size, threads=threads, beam_size=beam_size, compute_type=compute_type,
+                              device=device)
+    import_backend(backend)
+    return TorchTranscriber(model_size, threads=threads, beam_size=beam_size, device=device)
+
+
+def device_from_env(prefix="WHISPER"):
+    """{prefix}_DEVICE (cpu, cuda or auto), or None for the backend's default"""
+    return os.getenv(f"{prefix}_DEVICE") or None
+
+
+def backend_from_env(prefix="WHISPER"):
+    """
+    Backend settings from the environment, for scripts without a CLI:
+    {prefix}_BACKEND, {prefix}_THREADS, {prefix}_BEAM_SIZE, {prefix}_COMPUTE_TYPE,
+    {prefix}_DEVICE (see device_from_env)
+    """
+    beam_size = os.getenv(f"{prefix}_BEAM_SIZE")
+    return {
+        "backend": os.getenv(f"{prefix}_BACKEND", DEFAULT_BACKEND),
+        "threads": int(os.getenv(f"{prefix}_THREADS", "0")),
+        "beam_size": int(beam_size) if beam_size else None,
+        "compute_type": os.getenv(f"{prefix}_COMPUTE_TYPE", DEFAULT_COMPUTE_TYPE),
+        "device": device_from_env(prefix)
+    }
@@ -1,42 +1,539 @@
 #!/usr/bin/env python3
 """
 Simple Whisper transcription script for Node.js backend.
-Usage: python whisper_transcribe.py <video_path>
+Usage: python whisper_transcribe.py <video_path> [--model base|auto [--slo-sec 60]] [--no-cache] [--vad]
+                                    [--chunk-sec 60 [--chunk-jobs N]]
+       python whisper_transcribe.py --batch <path> [<path> ...] [--manifest FILE] [--prefetch N]
+                                    [--backend torch|ctranslate2 [--compute-type int8]]
+                                    [--threads N] [--beam-size N] [--device cpu|cuda|auto]
+       python whisper_transcribe.py --serve [--models base,small] [--server-jobs N]
+                                    [--queue-size N] [--port PORT]
 Output: JSON to stdout {"text": "transcribed text", "language": "en"}
+
+With --backend ctranslate2, the model runs through faster-whisper
+(CTranslate2) with --compute-type int8 on CPU instead of PyTorch; see
+transcribe_backends.py and benchmark_transcribe_backends.py.
+
+Results are cached on disk by file content hash, backend, model name and
+package version (see result_cache.py), so re-runs on unchanged files skip
+loading torch and the model entirely.
+
+With --vad, only the speech regions found by speech_activity.py are
+transcribed (long silences before, between and after answers are cut) and
+the output gains "vad": {"audio_sec", "speech_sec", "skipped_sec",
+"skipped_percent", "regions"}, regions given on the original timeline.
+
+With --chunk-sec, long audio is split at quiet points near every chunk-sec
+seconds and the chunks are transcribed in parallel by --chunk-jobs
+processes (default: one per CPU), then stitched back into one transcript;
+see chunked_transcription.py.
+
+With --model auto, each job gets the most accurate size whose estimated
+latency - audio queued ahead of it plus its own, times the real-time factor
+measured for that model on this host - fits --slo-sec (model_policy.py);
+the output then carries the decision as "model_policy". Every
+transcription updates the measured real-time factors.
+
+Before loading the model the file is probed (media_probe.py, container
+metadata only): a recording without an audio stream returns an empty
+transcript straight away instead of failing inside Whisper's ffmpeg decode.
+
+With --batch (or --manifest, a JSON list or one path per line), many files
+go through one resident model: cache hits are answered first, the audio of
+the next --prefetch files is decoded on background threads while the
+current one is transcribed, and one JSON line is written per file as it
+finishes:
+  {"video_path": "...", "result": {"text": "...", "language": "en"}}  or
+  {"video_path": "...", "error": "..."}
+followed by {"type": "done", "files": N, "cached": N, "failed": N, "elapsed_sec": S}.
+
+With --serve, the script stays up as a worker: torch and the --models are
+loaded once and jobs arrive as JSON lines, on stdin/stdout or, with --port,
+on a TCP socket bound to 127.0.0.1 (see serve()). The one-shot CLI above is
+unchanged.
+
+Models are loaded through the process-wide registry in model_registry.py
+(lazy, one load per model and settings, least recently used evicted past
+WHISPER_MAX_MODELS; WHISPER_WARM_MODELS are loaded at --serve startup).
 """
 
+import os
 import sys
 import json
+import time
+import queue
+import signal
+import socket
+import argparse
+import threading
 import warnings
 warnings.filterwarnings("ignore")
 
+from result_cache import open_cache, cache_key, content_hash, package_version
+from media_probe import probe_media
+from batch_transcription import DEFAULT_PREFETCH, prefetch_audio, read_manifest
+from model_policy import AUTO_MODEL, audio_seconds, choose_model_size, policy_sizes, rtf_table, rtf_key
+from model_registry import model_registry, warm_sizes
+from transcribe_backends import (TRANSCRIBE_BACKENDS, DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE, PACKAGES,
+                                 device_from_env, import_backend, model_label)
+
+DEFAULT_MODEL = "base"
+DEFAULT_SERVER_JOBS = 1
+DEFAULT_QUEUE_SIZE = 16  # jobs waiting for a worker before new ones are refused
+
+
+def parse_args(argv):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Whisper transcription")
+    parser.add_argument("video_paths", nargs="*", metavar="video_path",
+                        help="Path to the video/audio file (several with --batch)")
+    parser.add_argument("--model", default=DEFAULT_MODEL,
+                        help="Whisper model size, or auto to pick one per job from load and the latency SLO")
+    parser.add_argument("--slo-sec", type=float, default=None,
+                        help="Target latency per job for --model auto (default: WHISPER_SLO_SEC or 60)")
+    parser.add_argument("--backend", choices=TRANSCRIBE_BACKENDS, default=DEFAULT_BACKEND,
+                        help="openai-whisper (torch) or faster-whisper (ctranslate2)")
+    parser.add_argument("--compute-type", default=DEFAULT_COMPUTE_TYPE,
+                        help="CTranslate2 compute type (int8, int8_float32, float32, ...)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="CPU threads for inference (0 = library default)")
+    parser.add_argument("--beam-size", type=int, default=None,
+                        help="Beam size (default: greedy for torch, 5 for ctranslate2)")
+    parser.add_argument("--device", default=device_from_env(),
+                        help="cpu, cuda or auto (default: WHISPER_DEVICE, else auto for torch "
+                             "and cpu for ctranslate2)")
+    parser.add_argument("--vad", action="store_true",
+                        help="Transcribe only detected speech, skipping long silences")
+    parser.add_argument("--chunk-sec", type=float, default=0,
+                        help="Transcribe in parallel chunks of about this many seconds (0 = off)")
+    parser.add_argument("--chunk-jobs", type=int, default=0,
+                        help="Processes for --chunk-sec (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the shared result cache")
+    parser.add_argument("--batch", action="store_true",
+                        help="Transcribe every given file with one model, one JSON line per file")
+    parser.add_argument("--manifest", default=None,
+                        help="File listing paths for --batch (JSON list or one per line)")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help="Files decoded ahead of the one being transcribed in --batch mode")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived worker reading JSON-line jobs")
+    parser.add_argument("--models", default=None,
+                        help="Comma-separated model sizes to load in --serve mode (default: --model)")
+    parser.add_argument("--server-jobs", type=int, default=DEFAULT_SERVER_JOBS,
+                        help="Files transcribed concurrently in --serve mode")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Jobs that may wait for a worker in --serve mode")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Serve on 127.0.0.1:PORT instead of stdin/stdout")
+    args = parser.parse_args(argv)
+    args.batch = args.batch or bool(args.manifest)
+    args.video_path = args.video_paths[0] if args.video_paths else None
+    args.server_jobs = max(1, args.server_jobs)
+    args.queue_size = max(1, args.queue_size)
+    return args
+
+
+def transcription_cache_key(video_path, model_name, args):
+    """Result cache key: file contents + backend/model + package version + VAD + device"""
+    label = model_label(args.backend, model_name, args.compute_type, args.beam_size)
+    return cache_key(content_hash(video_path), label, package_version(PACKAGES[args.backend]),
+                     {"task": "transcribe", "vad": args.vad, "chunk_sec": args.chunk_sec, "device": args.device})
+
+
+def cache_lookup(cache, video_path, model_name, args):
+    """(key, cached result); key is None when the cache is off or the file is missing"""
+    if cache is None:
+        return None, None
+    try:
+        key = transcription_cache_key(video_path, model_name, args)
+    except OSError:
+        return None, None  # missing file: let Whisper report it
+    return key, cache.get(key)
+
+
+def rtf_label(args, model_name):
+    """Key of a model's measured real-time factor with these options"""
+    return rtf_key(model_name, args.backend, args.compute_type, args.beam_size,
+                   chunked=bool(args.chunk_sec), vad=args.vad)
+
+
+def resolve_model(args, model_name, video_path, queued_audio_sec=0.0, workers=1):
+    """(model size, policy decision or None); only --model auto consults the policy"""
+    if model_name != AUTO_MODEL:
+        return model_name, None
+    return choose_model_size(audio_seconds(video_path), queued_audio_sec, args.slo_sec,
+                             label=lambda size: rtf_label(args, size), workers=workers)
+
+
+def with_decision(output, decision):
+    """Output with the model policy decision attached (not stored in the cache)"""
+    return {**output, "model_policy": decision} if decision else output
+
+
+def model_loader(args):
+    """load(model_name, slot=None) from the model registry, for the backend options in args"""
+    return lambda name, slot=None: model_registry().get(
+        name, args.backend, device=args.device, threads=args.threads, beam_size=args.beam_size,
+        compute_type=args.compute_type, chunk_sec=args.chunk_sec, chunk_jobs=args.chunk_jobs, slot=slot)
+
+
+def transcribe_file(get_model, video_path, model_name, cache=None, key=None, vad=False, audio=None,
+                    rtf_key=None):
+    """
+    Transcribe one file and return the output dict. get_model(name) returns a
+    loaded transcriber (see transcribe_backends.py); it is not called for
+    files without audio. With vad, only detected speech is transcribed.
+    audio is the file's already decoded audio (see batch_transcription.py);
+    without it the file is decoded by the model. With rtf_key, the timing is
+    recorded in the model policy's real-time factor table.
+    """
+    source = video_path if audio is None else audio
+    probe = probe_media(video_path, use_cache=cache is not None)
+    if probe is not None and not probe["has_audio"]:
+        output = {"text": "", "language": "en"}
+    else:
+        if probe is not None:
+            print(f"[whisper_transcribe] audio duration: {probe['duration_sec']}s", file=sys.stderr)
+        model = get_model(model_name)
+        started = time.perf_counter()
+        if vad:
+            from speech_activity import transcribe_speech
+            result = transcribe_speech(model, source)
+            print(f"[whisper_transcribe] VAD skipped {result['vad']['skipped_sec']}s of "
+                  f"{result['vad']['audio_sec']}s", file=sys.stderr)
+        else:
+            result = model.transcribe(source)
+        if rtf_key and probe is not None:
+            rtf_table().record(rtf_key, probe["duration_sec"], time.perf_counter() - started)
+        output = {
+            "text": result["text"].strip(),
+            "language": result.get("language", "en")
+        }
+        if vad:
+            output["vad"] = result["vad"]
+    if key:
+        cache.put(key, output)
+    return output
+
+
+class TranscriptionServer:
+    """
+    Job queue in front of `jobs` worker threads. Each worker has its own copy
+    of the models, a registry slot of its own (Whisper installs decoding
+    hooks on the model, so one instance cannot decode two files at once),
+    and takes jobs from a bounded queue; when the queue is full, new jobs are
+    refused with an error.
+    """
+
+    def __init__(self, args, model_names, jobs, queue_size):
+        self.args = args
+        self.load_model = model_loader(args)
+        self.model_names = model_names
+        self.cache = open_cache(not args.no_cache)
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.stats = {"active_jobs": 0, "completed_jobs": 0, "failed_jobs": 0}
+        self.pending_audio_sec = 0.0  # queued and running audio, for --model auto
+        self.stats_lock = threading.Lock()
+        self.started = time.time()
+        # Every worker keeps every model it may be asked for resident; jobs for
+        # other sizes are refused, so the registry cap stays fixed
+        self.sizes = (set(model_names) - {AUTO_MODEL} | set(warm_sizes())
+                      | set(policy_sizes() if AUTO_MODEL in model_names else ()))
+        model_registry().reserve(jobs * len(self.sizes))
+        self.workers = []
+        loaded = threading.Barrier(jobs + 1)
+        for slot in range(jobs):
+            t = threading.Thread(target=self._worker, args=(loaded, slot), daemon=True)
+            t.start()
+            self.workers.append(t)
+        loaded.wait()
+
+    def _worker(self, loaded, slot):
+        get_model = lambda name: self.load_model(name, slot)
+
+        try:
+            for name in dict.fromkeys([m for m in self.model_names if m != AUTO_MODEL] + warm_sizes()):
+                get_model(name)
+        finally:
+            loaded.wait()
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            reply, job_id, video_path, model_name, decision, audio_sec = job
+            with self.stats_lock:
+                self.stats["active_jobs"] += 1
+            failed = True
+            try:
+                key, result = cache_lookup(self.cache, video_path, model_name, self.args)
+                if result is None:
+                    result = transcribe_file(get_model, video_path, model_name, self.cache, key,
+                                             vad=self.args.vad, rtf_key=rtf_label(self.args, model_name))
+                reply({"id": job_id, "result": with_decision(result, decision)})
+                failed = False
+            except Exception as e:
+                reply({"id": job_id, "error": str(e)})
+            finally:
+                with self.stats_lock:
+                    self.stats["active_jobs"] -= 1
+                    self.stats["failed_jobs" if failed else "completed_jobs"] += 1
+                    self.pending_audio_sec -= audio_sec
+
+    def handle(self, request, reply):
+        """Answer one request through reply(); returns False for a shutdown request"""
+        job_id = request.get("id")
+        kind = request.get("type", "transcribe")
+        if kind == "shutdown":
+            return False
+        if kind == "health":
+            with self.stats_lock:
+                reply({"id": job_id, "status": "ok", **self.stats,
+                       "queued_jobs": self.jobs.qsize(), "models": self.model_names,
+                       "model_registry": model_registry().stats(),
+                       "uptime_sec": round(time.time() - self.started, 1)})
+            return True
+        if not request.get("video_path"):
+            reply({"id": job_id, "error": "No video path provided"})
+            return True
+        video_path = request["video_path"]
+        audio_sec = 0.0
+        model_name, decision = request.get("model") or self.model_names[0], None
+        if model_name == AUTO_MODEL:
+            audio_sec = audio_seconds(video_path) or 0.0
+            with self.stats_lock:
+                queued_audio_sec = self.pending_audio_sec
+            model_name, decision = resolve_model(self.args, model_name, video_path, queued_audio_sec,
+                                                 workers=len(self.workers))
+        if model_name not in self.sizes:
+            reply({"id": job_id, "error": f"Model {model_name} is not served "
+                                          f"(available: {', '.join(sorted(self.sizes))})"})
+            return True
+        try:
+            with self.stats_lock:
+                self.jobs.put_nowait((reply, job_id, video_path, model_name, decision, audio_sec))
+                self.pending_audio_sec += audio_sec
+        except queue.Full:
+            reply({"id": job_id, "error": "Queue full, retry later"})
+        return True
+
+    def close(self):
+        """Let queued and running jobs finish, then stop the workers"""
+        for _ in self.workers:
+            self.jobs.put(None)
+        for t in self.workers:
+            t.join()
+
+
+def line_writer(stream):
+    """Thread-safe JSON-line reply function for a text stream"""
+    lock = threading.Lock()
+
+    def reply(message):
+        line = json.dumps(message)
+        with lock:
+            try:
+                stream.write(line + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # client went away
+
+    return reply
+
+
+def read_requests(lines, reply):
+    """Parse JSON-line requests, answering malformed ones directly"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            reply({"id": None, "error": "Invalid JSON request"})
+
+
+def serve(args):
+    """
+    Long-lived worker. Reads one JSON request per line:
+      {"id": 1, "video_path": "...", "model": "small"}  (model defaults to the first of --models;
+                                                   other sizes must be in --models, the policy or warm sizes)
+      {"id": 2, "type": "health"}
+      {"type": "shutdown"}
+    and writes one JSON line per request with the same id:
+      {"id": 1, "result": {"text": "...", "language": "en"}}  or  {"id": 1, "error": "..."}
+      {"id": 2, "status": "ok", "active_jobs": 0, "queued_jobs": 0, ...}
+    Replies may come back out of order. A {"type": "ready"} line is written to
+    stdout once the models are loaded; with --port each connection is its own
+    JSON-line channel. Shutdown (request, stdin EOF or SIGTERM) stops taking
+    jobs and waits for queued and running ones to finish.
+    """
+    # Keep stray library prints off the protocol channel
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    reply = line_writer(out)
+
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    model_names = [m.strip() for m in (args.models or args.model).split(",") if m.strip()]
+    server = TranscriptionServer(args, model_names, args.server_jobs, args.queue_size)
+    try:
+        if args.port:
+            serve_socket(server, args.port, reply)
+        else:
+            reply({"type": "ready", "pid": os.getpid(), "models": model_names})
+            for request in read_requests(sys.stdin, reply):
+                if not server.handle(request, reply):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        reply({"type": "shutdown"})
+
+
+def serve_socket(server, port, announce):
+    """Accept JSON-line connections on 127.0.0.1:port until a shutdown request"""
+    stopping = threading.Event()
+
+    def handle_connection(conn):
+        pending = [0]  # requests on this connection still owed a reply
+        done = threading.Condition()
+        with conn, conn.makefile("r", encoding="utf-8") as rfile, \
+                conn.makefile("w", encoding="utf-8") as wfile:
+            write = line_writer(wfile)
+
+            def reply(message):
+                write(message)
+                with done:
+                    pending[0] -= 1
+                    done.notify_all()
+
+            for request in read_requests(rfile, write):
+                if request.get("type") == "shutdown":
+                    stopping.set()
+                    break
+                with done:
+                    pending[0] += 1
+                server.handle(request, reply)
+            # Keep the connection open until every reply has been written
+            with done:
+                done.wait_for(lambda: pending[0] <= 0)
+
+    with socket.create_server(("127.0.0.1", port)) as listener:
+        listener.settimeout(0.5)
+        announce({"type": "ready", "pid": os.getpid(), "models": server.model_names, "port": port})
+        while not stopping.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+
+
+def run_batch(args):
+    """--batch: transcribe many files with one model, writing a JSON line per file"""
+    started = time.time()
+    try:
+        paths = args.video_paths + (read_manifest(args.manifest) if args.manifest else [])
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": f"Cannot read manifest: {e}"}))
+        sys.exit(1)
+    if not paths:
+        print(json.dumps({"error": "No video path provided"}))
+        sys.exit(1)
+
+    out = sys.stdout
+    sys.stdout = sys.stderr  # keep stray library prints off the output
+    reply = line_writer(out)
+    cache = open_cache(not args.no_cache)
+    counts = {"files": len(paths), "cached": 0, "failed": 0}
+
+    # Cache hits are answered straight away; only misses are decoded. With
+    # --model auto, each file's latency includes the audio queued before it.
+    misses, jobs = [], []
+    queued_audio_sec = 0.0
+    for path in paths:
+        model_name, decision = resolve_model(args, args.model, path, queued_audio_sec)
+        key, cached = cache_lookup(cache, path, model_name, args)
+        if cached is not None:
+            counts["cached"] += 1
+            reply({"video_path": path, "result": with_decision(cached, decision)})
+        else:
+            misses.append(path)
+            jobs.append((key, model_name, decision))
+            if decision:
+                queued_audio_sec += decision["audio_sec"]
+
+    if misses:
+        try:
+            import_backend(args.backend)
+        except ImportError as e:
+            reply({"error": str(e)})
+            sys.exit(1)
+        get_model = model_loader(args)
+        decoded = prefetch_audio(misses, depth=max(0, args.prefetch))
+        for (key, model_name, decision), (path, audio, error) in zip(jobs, decoded):
+            try:
+                if error is not None:
+                    raise error
+                result = transcribe_file(get_model, path, model_name, cache, key, vad=args.vad, audio=audio,
+                                         rtf_key=rtf_label(args, model_name))
+                reply({"video_path": path, "result": with_decision(result, decision)})
+            except Exception as e:
+                counts["failed"] += 1
+                reply({"video_path": path, "error": str(e)})
+
+    reply({"type": "done", **counts, "elapsed_sec": round(time.time() - started, 1)})
+    if counts["failed"]:
+        sys.exit(1)
+
+
 def main():
-    if len(sys.argv) < 2:
+    args = parse_args(sys.argv[1:])
+    if args.batch:
+        run_batch(args)
+        return
+    if not args.video_path and not args.serve:
         print(json.dumps({"error": "No video path provided"}))
         sys.exit(1)
-    
-    video_path = sys.argv[1]
-    
+
+    video_path = args.video_path
+
+    # A cache hit answers before torch/Whisper are imported
+    cache, key = None, None
+    model_name, decision = args.model, None
+    if not args.serve:
+        model_name, decision = resolve_model(args, args.model, video_path)
+        cache = open_cache(not args.no_cache)
+        key, cached = cache_lookup(cache, video_path, model_name, args)
+        if cached is not None:
+            print(json.dumps(with_decision(cached, decision)))
+            return
+
     try:
-        import whisper
-    except ImportError:
-        print(json.dumps({"error": "Whisper not installed. Run: pip install openai-whisper"}))
+        import_backend(args.backend)
+    except ImportError as e:
+        print(json.dumps({"error": str(e)}))
         sys.exit(1)
-    
+
+    if args.serve:
+        serve(args)
+        return
+
     try:
-        # Load model (cached after first load)
-        model = whisper.load_model("base")
-        
-        # Transcribe
-        result = model.transcribe(video_path)
-        
+        # Load model and transcribe
+        output = transcribe_file(model_loader(args), video_path, model_name, cache, key, vad=args.vad,
+                                 rtf_key=rtf_label(args, model_name))
+
         # Output JSON to stdout
-        output = {
-            "text": result["text"].strip(),
-            "language": result.get("language", "en")
-        }
-        print(json.dumps(output))
-        
+        print(json.dumps(with_decision(output, decision)))
+
     except Exception as e:
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
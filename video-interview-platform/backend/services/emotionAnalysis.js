@@ -1,9 +1,17 @@
 const fs = require('fs');
 const path = require('path');
+const readline = require('readline');
 const { spawn } = require('child_process');
 const config = require('../config');
 
 const DEEPFACE_TIMEOUT_MS = 180000; // 3 min for large videos
+// The script gets the timeout minus this margin as --budget-seconds, so it
+// returns a best-effort result (with coverage) before being killed
+const DEEPFACE_BUDGET_MARGIN_SEC = 15;
+const budgetArgs = ['--budget-seconds', String(DEEPFACE_TIMEOUT_MS / 1000 - DEEPFACE_BUDGET_MARGIN_SEC)];
+
+// Long-lived `deepface_analyze.py --serve` process (only when DEEPFACE_SERVER=true)
+let worker = null;
 
 /**
  * Analyze emotions in a video file using DeepFace (Python subprocess).
@@ -22,34 +30,125 @@ async function analyzeEmotions(filePath) {
         return null;
     }
 
+    if (config.deepfaceServer) {
+        return runOnWorker(filePath, scriptPath);
+    }
     return runDeepFaceScript(filePath, scriptPath);
 }
 
+/**
+ * Use the venv Python if available (same logic as transcription.js).
+ */
+function resolvePythonCmd() {
+    const venvPython = path.resolve(__dirname, '..', 'venv', 'Scripts', 'python.exe');
+    const ispVenv = path.resolve(__dirname, '..', '..', '..', 'isp', 'Scripts', 'python.exe');
+    let pythonCmd = 'python';
+
+    console.log('[EmotionAnalysis] Checking venv paths...');
+    console.log('[EmotionAnalysis] venvPython:', venvPython, '- exists:', fs.existsSync(venvPython));
+    console.log('[EmotionAnalysis] ispVenv:', ispVenv, '- exists:', fs.existsSync(ispVenv));
+
+    if (fs.existsSync(venvPython)) {
+        pythonCmd = venvPython;
+    } else if (fs.existsSync(ispVenv)) {
+        pythonCmd = ispVenv;
+    }
+    return pythonCmd;
+}
+
+/**
+ * Start (or reuse) the persistent DeepFace worker. Models load once per worker;
+ * jobs and replies are JSON lines matched by id.
+ */
+function getWorker(scriptPath) {
+    if (worker) return worker;
+
+    const pythonCmd = resolvePythonCmd();
+    console.log('[EmotionAnalysis] Starting DeepFace worker:', pythonCmd, scriptPath);
+    const proc = spawn(pythonCmd, [scriptPath, '--serve', ...(config.deepfaceArgs || [])], {
+        stdio: ['pipe', 'pipe', 'pipe']
+    });
+    const w = { proc, pending: new Map(), nextId: 1 };
+
+    readline.createInterface({ input: proc.stdout }).on('line', (line) => {
+        let msg;
+        try {
+            msg = JSON.parse(line);
+        } catch (e) {
+            return;
+        }
+        // Streamed {"type": "frame"} lines are progress only; wait for result/error
+        const job = msg.id != null && msg.type !== 'frame' ? w.pending.get(msg.id) : null;
+        if (!job) return;
+        w.pending.delete(msg.id);
+        clearTimeout(job.timer);
+        if (msg.error) {
+            job.reject(new Error('DeepFace error: ' + msg.error));
+        } else {
+            console.log('[EmotionAnalysis] Done — analyzed', msg.result.analyzed_frames, 'frames,', msg.result.faces_detected, 'faces detected');
+            job.resolve(msg.result);
+        }
+    });
+    proc.stderr.on('data', () => {}); // TensorFlow noise; keep the pipe drained
+
+    const fail = (reason) => {
+        if (worker === w) worker = null;
+        for (const job of w.pending.values()) {
+            clearTimeout(job.timer);
+            job.reject(new Error('DeepFace worker ' + reason));
+        }
+        w.pending.clear();
+    };
+    proc.on('exit', (code) => fail('exited (code ' + code + ')'));
+    proc.on('error', (err) => fail('failed: ' + err.message));
+
+    worker = w;
+    return w;
+}
+
+function runOnWorker(filePath, scriptPath) {
+    return new Promise((resolve, reject) => {
+        const w = getWorker(scriptPath);
+        const id = w.nextId++;
+        const timer = setTimeout(() => {
+            w.pending.delete(id);
+            // Stop the job too, so it stops holding one of the worker's --server-jobs slots
+            try {
+                w.proc.stdin.write(JSON.stringify({ id, type: 'cancel' }) + '\n');
+            } catch (_) {}
+            reject(new Error('DeepFace analysis timed out after ' + (DEEPFACE_TIMEOUT_MS / 1000) + 's'));
+        }, DEEPFACE_TIMEOUT_MS);
+        w.pending.set(id, { resolve, reject, timer });
+        console.log('[EmotionAnalysis] Queued on worker:', filePath);
+        w.proc.stdin.write(JSON.stringify({ id, video_path: filePath, args: budgetArgs }) + '\n');
+    });
+}
+
+/**
+ * Ask the persistent worker to finish running jobs and exit.
+ */
+function stopWorker() {
+    if (!worker) return;
+    try {
+        worker.proc.stdin.write(JSON.stringify({ type: 'shutdown' }) + '\n');
+        worker.proc.stdin.end();
+    } catch (_) {}
+    worker = null;
+}
+
 /**
  * Spawn Python subprocess to run deepface_analyze.py.
  */
 function runDeepFaceScript(filePath, scriptPath) {
     return new Promise((resolve, reject) => {
-        // Use the venv Python if available (same logic as transcription.js)
-        const venvPython = path.resolve(__dirname, '..', 'venv', 'Scripts', 'python.exe');
-        const ispVenv = path.resolve(__dirname, '..', '..', '..', 'isp', 'Scripts', 'python.exe');
-        let pythonCmd = 'python';
-        
-        console.log('[EmotionAnalysis] Checking venv paths...');
-        console.log('[EmotionAnalysis] venvPython:', venvPython, '- exists:', fs.existsSync(venvPython));
-        console.log('[EmotionAnalysis] ispVenv:', ispVenv, '- exists:', fs.existsSync(ispVenv));
-        
-        if (fs.existsSync(venvPython)) {
-            pythonCmd = venvPython;
-        } else if (fs.existsSync(ispVenv)) {
-            pythonCmd = ispVenv;
-        }
+        const pythonCmd = resolvePythonCmd();
 
         console.log('[EmotionAnalysis] Using Python:', pythonCmd);
         console.log('[EmotionAnalysis] Script:', scriptPath);
         console.log('[EmotionAnalysis] Video:', filePath);
 
-        const py = spawn(pythonCmd, [scriptPath, filePath], {
+        const args = [scriptPath, filePath, ...budgetArgs, ...(config.deepfaceArgs || [])];
+        const py = spawn(pythonCmd, args, {
             stdio: ['ignore', 'pipe', 'pipe']
         });
 
@@ -76,6 +175,9 @@ function runDeepFaceScript(filePath, scriptPath) {
                         return;
                     }
                     console.log('[EmotionAnalysis] Done — analyzed', result.analyzed_frames, 'frames,', result.faces_detected, 'faces detected');
+                    if (result.budget && (result.budget.stopped_early || result.budget.reduced_sampling)) {
+                        console.log('[EmotionAnalysis] Time budget reached — coverage', result.budget.coverage_percent + '%,', 'sample interval', result.budget.effective_sample_interval_sec + 's');
+                    }
                     resolve(result);
                     return;
                 } catch (e) {
@@ -96,4 +198,4 @@ function runDeepFaceScript(filePath, scriptPath) {
     });
 }
 
-module.exports = { analyzeEmotions };
+module.exports = { analyzeEmotions, stopWorker };
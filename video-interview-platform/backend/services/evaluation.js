@@ -113,11 +113,15 @@ async function evaluateEmotions(emotionData, expectedEmotions, questionText) {
     const systemPrompt = `You are an interview emotion evaluator. Output ONLY valid JSON with no markdown or extra text.`;
     
     const emotionSummary = emotionData.summary;
+    const longestRun = emotionSummary.longest_continuous_emotion;
+    const longestRunLine = longestRun?.emotion
+        ? `\n- Longest continuous emotion: ${longestRun.emotion} (${longestRun.duration_sec}s, from ${longestRun.start_sec}s to ${longestRun.end_sec}s)`
+        : '';
     const userPrompt = `Interview question: "${questionText}"
 
 Candidate's detected emotions during the video:
 - Dominant overall emotion: ${emotionSummary.dominant_emotion_overall}
-- Longest shown emotion: ${emotionSummary.longest_emotion?.emotion} (${emotionSummary.longest_emotion?.duration_sec}s)
+- Longest shown emotion: ${emotionSummary.longest_emotion?.emotion} (${emotionSummary.longest_emotion?.duration_sec}s)${longestRunLine}
 - Emotion distribution: ${JSON.stringify(emotionSummary.emotion_distribution_percent)}
 - Average emotion scores: ${JSON.stringify(emotionSummary.average_scores)}
 
@@ -1,11 +1,15 @@
 const fs = require('fs');
 const path = require('path');
 const os = require('os');
+const readline = require('readline');
 const { spawn } = require('child_process');
 const config = require('../config');
 
 const WHISPER_TIMEOUT_MS = 120000; // 2 min for large uploads
 
+// Long-lived `whisper_transcribe.py --serve` process (only when WHISPER_SERVER=true)
+let worker = null;
+
 /**
  * Transcribe audio/video to text.
  * Priority: OPENAI_API_KEY > WHISPERX_SCRIPT_PATH > USE_WHISPER_NODE (whisper-node).
@@ -53,16 +57,99 @@ async function transcribeWithOpenAIWhisper(filePath) {
     return { text };
 }
 
+function resolvePythonCmd() {
+    // Use the venv Python if available
+    const venvPython = path.join(__dirname, '..', 'venv', 'Scripts', 'python.exe');
+    return fs.existsSync(venvPython) ? venvPython : 'python';
+}
+
+/**
+ * Start (or reuse) the persistent Whisper worker. Models load once per worker;
+ * jobs and replies are JSON lines matched by id.
+ */
+function getWorker() {
+    if (worker) return worker;
+
+    const pythonCmd = resolvePythonCmd();
+    console.log('[Transcription] Starting Whisper worker:', pythonCmd, config.whisperXScriptPath);
+    const proc = spawn(pythonCmd, [config.whisperXScriptPath, '--serve', ...(config.whisperArgs || [])], {
+        stdio: ['pipe', 'pipe', 'pipe']
+    });
+    const w = { proc, pending: new Map(), nextId: 1 };
+
+    readline.createInterface({ input: proc.stdout }).on('line', (line) => {
+        let msg;
+        try {
+            msg = JSON.parse(line);
+        } catch (e) {
+            return;
+        }
+        const job = msg.id != null ? w.pending.get(msg.id) : null;
+        if (!job) return;
+        w.pending.delete(msg.id);
+        clearTimeout(job.timer);
+        if (msg.error) {
+            job.reject(new Error('Whisper error: ' + msg.error));
+        } else {
+            const text = msg.result.text || '';
+            console.log('[Transcription] Whisper worker done, length:', text.length);
+            job.resolve({ text });
+        }
+    });
+    proc.stderr.on('data', () => {}); // torch/ffmpeg noise; keep the pipe drained
+
+    const fail = (reason) => {
+        if (worker === w) worker = null;
+        for (const job of w.pending.values()) {
+            clearTimeout(job.timer);
+            job.reject(new Error('Whisper worker ' + reason));
+        }
+        w.pending.clear();
+    };
+    proc.on('exit', (code) => fail('exited (code ' + code + ')'));
+    proc.on('error', (err) => fail('failed: ' + err.message));
+
+    worker = w;
+    return w;
+}
+
+function transcribeOnWorker(filePath) {
+    return new Promise((resolve, reject) => {
+        const w = getWorker();
+        const id = w.nextId++;
+        const timer = setTimeout(() => {
+            w.pending.delete(id);
+            reject(new Error('Whisper transcription timed out after ' + (WHISPER_TIMEOUT_MS / 1000) + 's'));
+        }, WHISPER_TIMEOUT_MS);
+        w.pending.set(id, { resolve, reject, timer });
+        console.log('[Transcription] Queued on worker:', filePath);
+        w.proc.stdin.write(JSON.stringify({ id, video_path: filePath }) + '\n');
+    });
+}
+
+/**
+ * Ask the persistent worker to finish queued jobs and exit.
+ */
+function stopWorker() {
+    if (!worker) return;
+    try {
+        worker.proc.stdin.write(JSON.stringify({ type: 'shutdown' }) + '\n');
+        worker.proc.stdin.end();
+    } catch (_) {}
+    worker = null;
+}
+
 async function transcribeWithWhisperX(filePath) {
+    if (config.whisperServer) {
+        return transcribeOnWorker(filePath);
+    }
     return new Promise((resolve, reject) => {
-        // Use the venv Python if available
-        const venvPython = path.join(__dirname, '..', 'venv', 'Scripts', 'python.exe');
-        const pythonCmd = fs.existsSync(venvPython) ? venvPython : 'python';
+        const pythonCmd = resolvePythonCmd();
         
         console.log('[Transcription] Using Python:', pythonCmd);
         console.log('[Transcription] Script:', config.whisperXScriptPath);
         
-        const py = spawn(pythonCmd, [config.whisperXScriptPath, filePath], {
+        const py = spawn(pythonCmd, [config.whisperXScriptPath, filePath, ...(config.whisperArgs || [])], {
             stdio: ['ignore', 'pipe', 'pipe']
         });
         let stdout = '';
@@ -153,4 +240,4 @@ async function transcribeWithWhisperNode(filePath) {
     }
 }
 
-module.exports = { transcribe };
+module.exports = { transcribe, stopWorker };